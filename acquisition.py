@@ -0,0 +1,127 @@
+import collections
+import threading
+import time
+
+import instrumentation
+from smu_parse import parse_pair
+from smu_state import CachedDevice
+
+# One timestamped sample from the four-point probe
+Reading = collections.namedtuple("Reading", ["timestamp", "v_inner", "v_outer", "i_outer"])
+
+
+def pair_method(device):
+    """
+    Returns the device's combined `measure_pair()` if it implements one, else None.
+
+    xtralien.Device turns any unknown attribute into a CLOI command, so only a
+    method defined on the device class itself is trusted. At present only
+    smu_sim.SimulatedDevice defines one: the CLOI protocol has no combined
+    vsense/smu query, so a real SMU always takes the two-read path and the
+    single round-trip saving is a simulator-only figure.
+    """
+    inner = device.device if isinstance(device, CachedDevice) else device
+    if callable(getattr(type(inner), "measure_pair", None)):
+        return inner.measure_pair
+    return None
+
+
+@instrumentation.timed("smu_read_seconds")
+def read_reading(device):
+    """
+    One blocking four-point acquisition of (V_inner, V_outer, I_outer).
+
+    If the device offers a combined `measure_pair()` (both channels
+    integrating over the same window in one round-trip) it is used. Otherwise
+    vsense1 (inner probes) and smu1 (outer probes) are read back-to-back and
+    the reading is stamped at the midpoint between the two replies, which is
+    the best estimate of when both were sampled.
+
+    Returns:
+        Reading: Timestamped inner voltage, outer voltage and outer current.
+
+    Raises:
+        smu_parse.MalformedResponseError: If either reply cannot be decoded.
+    """
+    measure_pair = pair_method(device)
+    if measure_pair is not None:
+        start = time.time()
+        v_inner, v_outer, i_outer = measure_pair()
+        return Reading((start + time.time()) / 2, v_inner, v_outer, i_outer)
+
+    v_data = device.vsense1.measure()
+    t_inner = time.time()
+    smu_data = device.smu1.measure()
+    timestamp = (t_inner + time.time()) / 2
+    return Reading(timestamp, *parse_pair(v_data, smu_data))
+
+
+class AcquisitionWorker(threading.Thread):
+    """
+    Background thread that polls the SMU and streams readings to the UI.
+
+    All blocking serial I/O happens here, so the Qt event loop (or any other
+    consumer) only has to drain the queue at its own display rate. The queue is
+    bounded: if the consumer falls behind, the oldest readings are dropped and
+    counted in `dropped` rather than letting memory grow.
+
+    Failed reads are put on the queue as the exception instance so the
+    consumer can log them in order with the readings.
+    """
+
+    def __init__(self, read_fn, interval=0.0, maxsize=1024):
+        """
+        Args:
+            read_fn (callable): Performs one blocking acquisition and returns a
+                Reading. Only ever called from this thread.
+            interval (float): Minimum seconds between reads (0 = back-to-back,
+                limited only by the device filter/integration time).
+            maxsize (int): Capacity of the reading queue.
+        """
+        super().__init__(daemon=True)
+        self.read_fn = read_fn
+        self.interval = interval
+        self.readings = collections.deque(maxlen=maxsize)
+        self.dropped = 0
+        self.count = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            try:
+                item = self.read_fn()
+                self.count += 1
+            except Exception as e:
+                item = e
+            with self._lock:
+                if len(self.readings) == self.readings.maxlen:
+                    self.dropped += 1
+                self.readings.append(item)
+
+            if self.interval:
+                remaining = self.interval - (time.monotonic() - started)
+                if remaining > 0:
+                    self._stop_event.wait(remaining)
+
+    def drain(self):
+        """
+        Returns (and removes) everything queued since the last call, oldest first.
+        """
+        with self._lock:
+            items = list(self.readings)
+            self.readings.clear()
+        return items
+
+    def stop(self, timeout=None):
+        """
+        Asks the loop to exit and waits for the in-flight read to finish.
+
+        Returns:
+            bool: True if the thread has exited.
+        """
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+        return not self.is_alive()
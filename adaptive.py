@@ -0,0 +1,122 @@
+import math
+import time
+
+import numpy as np
+
+from acquisition import Reading, read_reading
+
+# Filter depths the SMU accepts, shallowest (fastest, noisiest) first
+FILTER_LADDER = (64, 256, 1024, 4096, 8192)
+DEFAULT_TARGET = 1e-3    # 0.1 % relative uncertainty on V/I
+DEFAULT_REPEATS = 4      # Readings per filter depth used to estimate the noise
+
+
+def set_filter(device, depth):
+    """
+    Applies the same filter depth to smu1 and vsense1.
+    On a CachedDevice this costs nothing if the depth is unchanged.
+    """
+    device.smu1.set.filter(depth, response=0)
+    device.vsense1.set.filter(depth, response=0)
+
+
+def ratio_uncertainty(v_inner, i_outer):
+    """
+    Mean V/I and its relative standard error from repeated readings.
+
+    The sheet resistance is V/I times constant geometry factors, so the
+    relative uncertainty of V/I is also that of the sheet resistance.
+
+    Returns:
+        tuple: (ratio, relative standard error). The error is inf when it
+               cannot be estimated (fewer than two readings or no current).
+    """
+    v_inner = np.asarray(v_inner, dtype=float)
+    i_outer = np.asarray(i_outer, dtype=float)
+    if len(i_outer) == 0 or not np.all(i_outer):
+        return 0.0, math.inf
+    ratios = v_inner / i_outer
+    ratio = float(ratios.mean())
+    if len(ratios) < 2 or ratio == 0:
+        return ratio, math.inf
+    sem = float(ratios.std(ddof=1)) / math.sqrt(len(ratios))
+    return ratio, sem / abs(ratio)
+
+
+def measure_adaptive(device, target=DEFAULT_TARGET, repeats=DEFAULT_REPEATS,
+                     ladder=FILTER_LADDER, read_fn=read_reading, start_depth=None):
+    """
+    Takes the cheapest reading that reaches a target relative uncertainty.
+
+    Starts at `start_depth` (the shallowest depth by default) and takes
+    `repeats` readings. Their
+    scatter gives the relative standard error of V/I. Noise falls as
+    1/sqrt(depth), so if the target is missed the next depth is the
+    shallowest rung predicted to meet it (rungs that cannot are skipped),
+    rather than stepping through every one. Readings from earlier depths are
+    discarded, because they would otherwise dominate the noise estimate.
+
+    For a series of readings, pass the previous result's "next_filter" as
+    `start_depth`: a stable sample then stays at its depth instead of
+    climbing the whole ladder every time. "next_filter" is one rung
+    shallower only when the noise predicts that rung meets the target with
+    2x headroom, so the depth does not oscillate.
+
+    Args:
+        device: Open, configured device (smu1/vsense1 enabled, voltage set).
+        target (float): Relative standard error to reach, e.g. 1e-3 = 0.1 %.
+        repeats (int): Readings per depth (at least 2).
+        ladder (tuple): Allowed filter depths, ascending.
+        read_fn (callable): read_fn(device) -> acquisition.Reading.
+        start_depth (int): Depth to start at (e.g. the last "next_filter").
+
+    Returns:
+        dict: {"reading": averaged Reading, "ratio": mean V/I (Ohm),
+               "rel_uncertainty": float, "filter": final depth,
+               "next_filter": depth to start the next reading at,
+               "readings": total readings taken, "converged": bool,
+               "elapsed": seconds}
+    """
+    repeats = max(int(repeats), 2)
+    start = time.monotonic()
+    total = 0
+    k = ladder.index(start_depth) if start_depth in ladder else 0
+    while True:
+        depth = ladder[k]
+        set_filter(device, depth)
+        readings = [read_fn(device) for _ in range(repeats)]
+        total += len(readings)
+        v_inner = [r.v_inner for r in readings]
+        i_outer = [r.i_outer for r in readings]
+        ratio, rel = ratio_uncertainty(v_inner, i_outer)
+
+        converged = rel <= target
+        # No current (open probes / output off): deeper filtering will not help
+        if converged or math.isinf(rel) or k == len(ladder) - 1:
+            break
+        needed = depth * (rel / target) ** 2
+        k = next((j for j in range(k + 1, len(ladder)) if ladder[j] >= needed),
+                 len(ladder) - 1)
+
+    next_k = k
+    if math.isinf(rel):
+        next_k = 0
+    elif converged and k > 0 and ladder[k - 1] >= 2 * depth * (rel / target) ** 2:
+        next_k = k - 1
+
+    reading = Reading(
+        float(np.mean([r.timestamp for r in readings])),
+        float(np.mean(v_inner)),
+        float(np.mean([r.v_outer for r in readings])),
+        float(np.mean(i_outer))
+    )
+    return {
+        "reading": reading,
+        "ratio": ratio,
+        "rel_uncertainty": rel,
+        "filter": depth,
+        "next_filter": ladder[next_k],
+        "readings": total,
+        "converged": converged,
+        "elapsed": time.monotonic() - start
+    }
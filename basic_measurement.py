@@ -1,7 +1,9 @@
 import smu_utils
+import sys
 import time
 import pandas as pd
 import matplotlib.pyplot as plt
+from recorder import StreamingRecorder
 
 def main():
     """
@@ -10,6 +12,8 @@ def main():
     # Configuration
     # You might want to change this to your specific port
     PORT = "/dev/ttyACM0"  # Update this!
+    if len(sys.argv) > 1:
+        PORT = sys.argv[1]  # e.g. "sim" for the simulated SMU
     
     # Sweep Parameters
     V_START = 0.0
@@ -64,9 +68,11 @@ def main():
             df = pd.DataFrame(data_matrix, columns=['Voltage (V)', 'Current (A)'])
             print(df)
             
-            # Save to CSV
+            # Save to CSV (streamed row by row, overwriting any previous run)
             csv_name = "measurement_results.csv"
-            df.to_csv(csv_name, index=False)
+            with StreamingRecorder(csv_name, list(df.columns), resume=False) as rec:
+                for row in df.itertuples(index=False):
+                    rec.append(row)
             print(f"Data saved to {csv_name}")
             
             # Plot
@@ -0,0 +1,317 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+import adaptive
+import instrumentation
+import settling
+import smu_utils
+from acquisition import read_reading
+from gui_logic import MeasurementLogic
+from recorder import StreamingRecorder
+from smu_state import CachedDevice
+
+# Settings a job may set (job values override the file's "defaults")
+JOB_DEFAULTS = {
+    "sample_id": None,
+    "geometry": "Rectangular",
+    "length": 60.0,              # mm
+    "width": 60.0,               # mm
+    "diameter": 14.0,            # mm
+    "spacing": 1.27,             # mm
+    "thickness_um": 0.0,
+    "drive_v": 0.5,              # V, sign sets polarity
+    "samples": 8192,             # filter depth, or "adaptive"
+    "target_pct": 0.1,           # adaptive target (relative uncertainty, %)
+    "v_limit": 10.5,             # V
+    "i_limit_ma": 220.0,         # mA
+    "repeats": 10,               # readings stored per job
+    "settle_tolerance_pct": 0.5,
+    "settle_timeout": 2.0,       # s
+    "pause": 0.0,                # s to wait before the job (e.g. sample changer)
+}
+
+# JOB_DEFAULTS entries that must be numbers (and those that must not be negative)
+NUMERIC_SETTINGS = ("length", "width", "diameter", "spacing", "thickness_um", "drive_v",
+                    "target_pct", "v_limit", "i_limit_ma", "repeats",
+                    "settle_tolerance_pct", "settle_timeout", "pause")
+NON_NEGATIVE_SETTINGS = ("thickness_um", "settle_timeout", "pause")
+
+RESULT_COLUMNS = ["job", "sample_id", "repeat", "timestamp", "v_inner", "v_outer", "i_outer",
+                  "sheet_resistance", "resistivity", "conductivity", "filter"]
+
+EXIT_OK = 0
+EXIT_JOB_FAILED = 1
+EXIT_SETUP_FAILED = 2
+EXIT_INTERRUPTED = 130
+
+
+def load_jobs(path):
+    """
+    Reads and validates a job file.
+
+    Format (JSON):
+        {
+          "port": "/dev/ttyACM0",          # or an IP with "connection_type": "ethernet"
+          "output": "results/batch.csv",   # optional, strftime codes allowed
+          "defaults": {"thickness_um": 0.1, "samples": 1024},
+          "jobs": [{"sample_id": "A1"}, {"sample_id": "A2", "repeats": 50}]
+        }
+
+    Returns:
+        tuple: (settings dict, list of fully-resolved job dicts)
+
+    Raises:
+        ValueError: On unknown keys, missing sample_id or bad values, so a
+            typo fails before the overnight run starts rather than halfway.
+    """
+    with open(path) as f:
+        spec = json.load(f)
+    if not isinstance(spec.get("jobs"), list) or not spec["jobs"]:
+        raise ValueError(f"{path}: 'jobs' must be a non-empty list")
+
+    defaults = dict(JOB_DEFAULTS)
+    defaults.update(_checked(spec.get("defaults", {}), "defaults"))
+    jobs = []
+    for k, job in enumerate(spec["jobs"]):
+        resolved = dict(defaults)
+        resolved.update(_checked(job, f"jobs[{k}]"))
+        if not resolved["sample_id"]:
+            raise ValueError(f"jobs[{k}]: 'sample_id' is required")
+        if resolved["geometry"] not in ("Rectangular", "Circular"):
+            raise ValueError(f"jobs[{k}]: geometry must be Rectangular or Circular")
+        for name in NUMERIC_SETTINGS:
+            value = resolved[name]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) \
+                    or not math.isfinite(value):
+                raise ValueError(f"jobs[{k}]: '{name}' must be a number, got {value!r}")
+            if name in NON_NEGATIVE_SETTINGS and value < 0:
+                raise ValueError(f"jobs[{k}]: '{name}' must not be negative, got {value!r}")
+        samples = resolved["samples"]
+        if str(samples).lower() != "adaptive" and (isinstance(samples, bool) or
+                                                   samples not in adaptive.FILTER_LADDER):
+            raise ValueError(f"jobs[{k}]: samples must be one of "
+                             f"{list(adaptive.FILTER_LADDER)} or \"adaptive\"")
+        if resolved["repeats"] != int(resolved["repeats"]) or resolved["repeats"] < 1:
+            raise ValueError(f"jobs[{k}]: repeats must be a whole number of at least 1")
+        jobs.append(resolved)
+
+    settings = {
+        "port": spec.get("port", "/dev/ttyACM0"),
+        "connection_type": spec.get("connection_type", "usb"),
+        "output": spec.get("output", "results/batch_%Y%m%d_%H%M%S.csv"),
+    }
+    return settings, jobs
+
+
+def _checked(entry, where):
+    unknown = set(entry) - set(JOB_DEFAULTS)
+    if unknown:
+        raise ValueError(f"{where}: unknown setting(s) {sorted(unknown)}")
+    return entry
+
+
+def run_job(device, logic, job, index, recorder):
+    """
+    Configures, settles and takes `repeats` readings for one job, streaming
+    each reading to `recorder`.
+
+    Returns:
+        dict: Per-job summary (mean/std of sheet resistance, readings, time).
+    """
+    start = time.monotonic()
+    is_adaptive = str(job["samples"]).lower() == "adaptive"
+    smu_utils.configure_measurement(
+        device,
+        samples=adaptive.FILTER_LADDER[0] if is_adaptive else int(job["samples"]),
+        v_limit=job["v_limit"],
+        i_limit=job["i_limit_ma"] * 1e-3,
+        drive_v=job["drive_v"]
+    )
+    settled = settling.settle(device, tolerance=job["settle_tolerance_pct"] / 100,
+                              timeout=job["settle_timeout"])
+    geometry = {"length": job["length"], "width": job["width"],
+                "diameter": job["diameter"], "spacing": job["spacing"]}
+
+    values = []
+    start_depth = None
+    for repeat in range(int(job["repeats"])):
+        if is_adaptive:
+            result = adaptive.measure_adaptive(device, job["target_pct"] / 100,
+                                               start_depth=start_depth)
+            reading, depth = result["reading"], result["filter"]
+            start_depth = result["next_filter"]
+        else:
+            reading, depth = read_reading(device), int(job["samples"])
+        metrics = logic.calculate_metrics(reading.v_inner, reading.i_outer, job["geometry"],
+                                          job["thickness_um"], **geometry)
+        recorder.append({
+            "job": index, "sample_id": job["sample_id"], "repeat": repeat,
+            "timestamp": reading.timestamp, "v_inner": reading.v_inner,
+            "v_outer": reading.v_outer, "i_outer": reading.i_outer,
+            "sheet_resistance": metrics["sheet_resistance"],
+            "resistivity": metrics["resistivity"],
+            "conductivity": metrics["conductivity"], "filter": depth
+        })
+        values.append(metrics["sheet_resistance"])
+
+    mean = sum(values) / len(values)
+    std = math.sqrt(sum((v - mean) ** 2 for v in values) / (len(values) - 1)) if len(values) > 1 else 0.0
+    return {
+        "job": index, "sample_id": job["sample_id"], "status": "ok",
+        "readings": len(values), "sheet_resistance": mean, "std": std,
+        "compliance": smu_utils.check_compliance_error(device),
+        "settle_s": settled["settle_time"], "elapsed_s": time.monotonic() - start
+    }
+
+
+def run_batch(settings, jobs, output, log=print):
+    """
+    Runs every job back-to-back on one persistent session.
+
+    The source output is switched off after every job. A failing job is
+    logged and skipped; the session is reopened if the device stopped
+    answering. Ctrl-C abandons the reading in progress; the readings already
+    taken are kept and the summary is still written.
+
+    Returns:
+        tuple: (exit code, list of per-job summaries)
+    """
+    device = smu_utils.get_session(settings["port"], settings["connection_type"])
+    if not device:
+        log(f"Could not connect to {settings['port']}.")
+        return EXIT_SETUP_FAILED, []
+    # Settings shared by consecutive jobs are only sent once
+    device = CachedDevice(device)
+    logic = MeasurementLogic()
+    summaries = []
+    code = EXIT_OK
+
+    out_dir = os.path.dirname(output)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    recorder = StreamingRecorder(output, RESULT_COLUMNS, resume=False)
+    try:
+        for index, job in enumerate(jobs):
+            if job["pause"]:
+                time.sleep(job["pause"])
+            log(f"[{index + 1}/{len(jobs)}] {job['sample_id']}...")
+            try:
+                summary = run_job(device, logic, job, index, recorder)
+            except Exception as e:
+                code = EXIT_JOB_FAILED
+                summary = {"job": index, "sample_id": job["sample_id"], "status": "failed",
+                           "error": str(e)}
+                log(f"    FAILED: {e}")
+                device = _reconnect(device, settings, log)
+                if device is None:
+                    summaries.append(summary)
+                    break
+            else:
+                log(f"    Rs = {summary['sheet_resistance']:.6g} ± {summary['std']:.2g} Ω/sq "
+                    f"({summary['readings']} readings, {summary['elapsed_s']:.1f} s)"
+                    + ("  COMPLIANCE" if summary["compliance"] else ""))
+            summaries.append(summary)
+            recorder.flush()
+            # Output off between jobs, so the probes are never lifted or
+            # re-landed live (e.g. during a sample changer `pause`);
+            # run_job switches it on again for the next sample
+            try:
+                smu_utils.shutdown_output(device)
+            except Exception as e:
+                log(f"    Could not switch the output off: {e}")
+    except KeyboardInterrupt:
+        log("Interrupted; the reading in progress was abandoned.")
+        code = EXIT_INTERRUPTED
+    finally:
+        recorder.close()
+        if device is not None:
+            try:
+                smu_utils.shutdown_output(device)
+                device.close()
+            except Exception as e:
+                log(f"Error closing device: {e}")
+    return code, summaries
+
+
+def _reconnect(device, settings, log):
+    """
+    Keeps the session if it still answers, otherwise opens a new one.
+    """
+    try:
+        device.cloi.hello()
+        device.invalidate()  # Device state is unknown after a failure
+        return device
+    except Exception:
+        pass
+    try:
+        device.close()
+    except Exception:
+        pass
+    log("    Device not responding; reconnecting...")
+    fresh = smu_utils.get_session(settings["port"], settings["connection_type"])
+    if not fresh:
+        log("    Reconnect failed; aborting the remaining jobs.")
+        return None
+    return CachedDevice(fresh)
+
+
+def print_summary(summaries, jobs, output, elapsed):
+    print(f"\n{'Sample':<20} {'Status':<8} {'Rs (Ω/sq)':>14} {'Std':>10} {'N':>5}")
+    for s in summaries:
+        if s["status"] == "ok":
+            print(f"{s['sample_id']:<20} {'ok':<8} {s['sheet_resistance']:>14.6g} "
+                  f"{s['std']:>10.3g} {s['readings']:>5}")
+        else:
+            print(f"{s['sample_id']:<20} {'FAILED':<8} {s['error']}")
+    done = sum(1 for s in summaries if s["status"] == "ok")
+    readings = sum(s.get("readings", 0) for s in summaries)
+    print(f"\n{done}/{len(jobs)} jobs ok, {readings} readings in {elapsed:.1f} s -> {output}")
+
+
+def main(argv=None):
+    """
+    Usage:
+        python batch_runner.py jobs.json [--port /dev/ttyACM0] [--output FILE]
+        python batch_runner.py jobs.json --check     # validate only
+
+    Exit codes: 0 all jobs ok, 1 some jobs failed, 2 bad job file or no
+    connection, 130 interrupted.
+    """
+    parser = argparse.ArgumentParser(description="Run queued four-point probe jobs unattended")
+    parser.add_argument("jobs", help="JSON job file")
+    parser.add_argument("--port", help="Override the job file's port ('sim' for the simulator)")
+    parser.add_argument("--output", help="Override the job file's output CSV")
+    parser.add_argument("--summary-json", help="Also write the per-job summary as JSON")
+    parser.add_argument("--check", action="store_true", help="Validate the job file and exit")
+    args = parser.parse_args(argv)
+
+    try:
+        settings, jobs = load_jobs(args.jobs)
+    except (OSError, ValueError) as e:
+        print(f"Invalid job file: {e}")
+        return EXIT_SETUP_FAILED
+    if args.port:
+        settings["port"] = args.port
+    output = time.strftime(args.output or settings["output"])
+    if args.check:
+        print(f"{len(jobs)} job(s) OK, {sum(int(j['repeats']) for j in jobs)} readings planned.")
+        return EXIT_OK
+
+    instrumentation.autostart()  # SMU_METRICS_PORT / SMU_METRICS_JSON, if set
+    start = time.monotonic()
+    code, summaries = run_batch(settings, jobs, output)
+    elapsed = time.monotonic() - start
+    print_summary(summaries, jobs, output, elapsed)
+    if args.summary_json:
+        with open(args.summary_json, "w") as f:
+            json.dump({"exit_code": code, "elapsed_s": elapsed, "output": output,
+                       "jobs": summaries}, f, indent=2)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
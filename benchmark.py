@@ -0,0 +1,406 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import instrumentation
+import settling
+import smu_parse
+import smu_pool
+import smu_utils
+from acquisition import pair_method
+from smu_parse import parse_pair
+from gui_logic import MeasurementLogic
+from recorder import StreamingRecorder
+
+FILTER_SETTINGS = [64, 256, 1024, 4096, 8192]
+STAGES = ["connect", "configure", "settle", "measure", "parse", "compute", "record"]
+RESULT_COLUMNS = ["Current (A)", "Voltage (V)", "Sheet Resistance (Ohm/square)"]
+
+# Entry points timed by --startup, and the heavy dependencies tracked for each
+STARTUP_MODULES = ["smu_utils", "gui_logic", "batch_runner", "gui_main", "web_main"]
+HEAVY_MODULES = ["numpy", "pandas", "plotly", "PyQt6", "pyqtgraph", "serial", "xtralien",
+                 "streamlit", "matplotlib"]
+
+# Run in a fresh interpreter: time one import and list heavy modules it loaded
+_STARTUP_PROBE = """
+import json, sys, time
+t = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t
+print(json.dumps({{"s": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+class StageTimer:
+    """
+    Collects wall-clock durations per named stage.
+    """
+
+    def __init__(self):
+        self.samples = {}
+
+    def time(self, stage):
+        return _Timed(self, stage)
+
+    def add(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def summary(self):
+        out = {}
+        for stage in STAGES:
+            values = self.samples.get(stage)
+            if not values:
+                continue
+            arr = np.array(values) * 1e3  # ms
+            out[stage] = {
+                "count": len(values),
+                "mean_ms": float(arr.mean()),
+                "p50_ms": float(np.percentile(arr, 50)),
+                "p95_ms": float(np.percentile(arr, 95)),
+                "p99_ms": float(np.percentile(arr, 99)),
+                "max_ms": float(arr.max())
+            }
+        return out
+
+
+class _Timed:
+    def __init__(self, timer, stage):
+        self.timer = timer
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.add(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+def legacy_parse_readings(v_data, smu_data):
+    """
+    The per-reading parsing used before smu_parse (np.array/flatten/str/float
+    with silent 0.0 fallbacks). Kept only as the baseline for --parse-bench.
+    """
+    v_inner = 0.0
+    i_outer = 0.0
+    v_outer = 0.0
+    if v_data is not None:
+        v_arr = np.array(v_data).flatten()
+        if len(v_arr) > 0:
+            try:
+                val = str(v_arr[0]).strip()
+                if val: v_inner = float(val)
+            except: pass
+    if smu_data is not None:
+        smu_arr = np.array(smu_data).flatten()
+        if len(smu_arr) >= 2:
+            try:
+                val_v = str(smu_arr[0]).strip()
+                val_i = str(smu_arr[1]).strip()
+                if val_v: v_outer = float(val_v)
+                if val_i: i_outer = float(val_i)
+            except: pass
+    return v_inner, v_outer, i_outer
+
+
+def configure(device, samples):
+    """
+    Same command sequence as OssilaGUI.start_measurement / web MEASURE.
+    """
+    smu_utils.configure_measurement(device, samples)
+
+
+def shutdown(device):
+    smu_utils.shutdown_output(device)
+    device.close()
+
+
+def acquire(timer, device, logic, records, geometry, pair=False):
+    """
+    One reading: measure -> parse -> compute -> record.
+
+    With `pair`, the measure stage uses the device's combined measure_pair()
+    (see acquisition.read_reading) when it has one. Only the simulator does,
+    so on real hardware `pair` changes nothing.
+    """
+    measure_pair = pair_method(device) if pair else None
+    if measure_pair is not None:
+        with timer.time("measure"):
+            v_inner, v_outer, i_outer = measure_pair()
+    else:
+        with timer.time("measure"):
+            v_data = device.vsense1.measure()
+            smu_data = device.smu1.measure()
+        with timer.time("parse"):
+            v_inner, v_outer, i_outer = parse_pair(v_data, smu_data)
+    with timer.time("compute"):
+        metrics = logic.calculate_metrics(v_inner, i_outer, **geometry)
+    with timer.time("record"):
+        records.append({
+            "Current (A)": i_outer,
+            "Voltage (V)": v_inner,
+            "Sheet Resistance (Ohm/square)": metrics["sheet_resistance"]
+        })
+
+
+def open_recorder(workdir, samples):
+    """
+    Streaming CSV recorder configured like the GUI's results files.
+    """
+    return StreamingRecorder(f"{workdir}/bench_{samples}.csv", RESULT_COLUMNS,
+                             chunk_size=16)
+
+
+def run_gui_mode(address, samples, readings, sim_options, geometry, workdir, pair=False):
+    """
+    GUI loop: connect and configure once, then poll readings back-to-back.
+    """
+    timer = StageTimer()
+    logic = MeasurementLogic()
+    records = open_recorder(workdir, samples)
+    with timer.time("connect"):
+        device = smu_utils.get_session(address, sim_options=sim_options)
+    if not device:
+        raise RuntimeError(f"Could not connect to {address}")
+    with timer.time("configure"):
+        configure(device, samples)
+
+    start = time.perf_counter()
+    for _ in range(readings):
+        acquire(timer, device, logic, records, geometry, pair)
+    with timer.time("record"):
+        records.close()
+    elapsed = time.perf_counter() - start
+    shutdown(device)
+    return timer, elapsed
+
+
+def run_web_mode(address, samples, readings, sim_options, geometry, settle, workdir,
+                 pair=False):
+    """
+    Web MEASURE button as web_main runs it: every reading checks the pooled
+    session out of a smu_pool.ConnectionManager, configures it (through the
+    CachedDevice, so unchanged limits/filters are skipped), settles, measures
+    and switches the output off. The port stays open between presses, so the
+    "connect" stage is the pool checkout; only the first reading opens the
+    port. `settle` is a fixed sleep in seconds, or None to poll like web_main
+    does.
+    """
+    timer = StageTimer()
+    logic = MeasurementLogic()
+    records = open_recorder(workdir, samples)
+    manager = smu_pool.ConnectionManager(sim_options=sim_options)
+    start = time.perf_counter()
+    for _ in range(readings):
+        with contextlib.ExitStack() as stack:
+            with timer.time("connect"):
+                device = stack.enter_context(manager.session(address))
+            with timer.time("configure"):
+                configure(device, samples)
+            with timer.time("settle"):
+                if settle is None:
+                    settling.settle(device)
+                else:
+                    time.sleep(settle)
+            acquire(timer, device, logic, records, geometry, pair)
+            smu_utils.shutdown_output(device)
+    manager.close_all()
+    records.close()
+    elapsed = time.perf_counter() - start
+    return timer, elapsed
+
+
+def parse_benchmark(iterations=100000):
+    """
+    Decode cost per reading of legacy_parse_readings vs smu_parse.parse_pair
+    and smu_parse.decode_into, on replies shaped like xtralien's.
+
+    Returns:
+        dict: JSON-serialisable report with microseconds per reading.
+    """
+    v_data = np.array([0.0551404191505469])
+    smu_data = np.array([[0.4996662135904617, 0.005000691412789029]])
+    out = smu_parse.reading_array(1)
+    cases = {
+        "legacy": lambda: legacy_parse_readings(v_data, smu_data),
+        "parse_pair": lambda: parse_pair(v_data, smu_data),
+        "decode_into": lambda: smu_parse.decode_into(out, 0, v_data, smu_data),
+    }
+    results = {}
+    for name, fn in cases.items():
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        results[name] = {"us_per_reading": (time.perf_counter() - start) / iterations * 1e6}
+    return {
+        "benchmark": "response_parsing",
+        "iterations": iterations,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results
+    }
+
+
+def startup_benchmark(modules=STARTUP_MODULES, repeats=5):
+    """
+    Cold import time of each entry point, measured in a fresh interpreter per
+    run (so nothing is already in sys.modules), plus which heavy
+    dependencies the import pulled in. Modules whose dependencies are not
+    installed are reported with the error instead of a time.
+
+    Returns:
+        dict: JSON-serialisable report with median/min import time in ms.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=here + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    results = {}
+    for module in modules:
+        code = _STARTUP_PROBE.format(module=module, heavy=HEAVY_MODULES)
+        times, loaded, error = [], [], None
+        for _ in range(repeats):
+            proc = subprocess.run([sys.executable, "-c", code], cwd=here, env=env,
+                                  capture_output=True, text=True)
+            if proc.returncode != 0:
+                lines = proc.stderr.strip().splitlines()
+                error = lines[-1] if lines else f"exit code {proc.returncode}"
+                break
+            probe = json.loads(proc.stdout.strip().splitlines()[-1])
+            times.append(probe["s"] * 1e3)
+            loaded = probe["loaded"]
+        if error:
+            results[module] = {"error": error}
+        else:
+            results[module] = {"median_ms": float(np.median(times)), "min_ms": min(times),
+                               "heavy_loaded": loaded}
+    return {
+        "benchmark": "startup_imports",
+        "repeats": repeats,
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results
+    }
+
+
+def run_benchmark(address=smu_utils.SIM_ADDRESS, mode="gui", filters=FILTER_SETTINGS,
+                  readings=50, sim_options=None, settle=None, pair=False):
+    """
+    Runs the benchmark for each filter setting.
+
+    Returns:
+        dict: JSON-serialisable report with readings/s and per-stage latency.
+    """
+    geometry = {"geometry": "Rectangular", "thickness_microns": 1.0,
+                "length": 60.0, "width": 60.0, "spacing": 1.27}
+    if pair and address != smu_utils.SIM_ADDRESS:
+        # xtralien.Device has no measure_pair(); the channels are read one by one
+        print("Note: --pair only applies to the simulator; measuring the channels "
+              "back-to-back.", file=sys.stderr)
+        pair = False
+    results = []
+    workdir = tempfile.TemporaryDirectory(prefix="smu_bench_")
+    for samples in filters:
+        if mode == "web":
+            timer, elapsed = run_web_mode(address, samples, readings, sim_options,
+                                          geometry, settle, workdir.name, pair)
+        else:
+            timer, elapsed = run_gui_mode(address, samples, readings, sim_options,
+                                          geometry, workdir.name, pair)
+        results.append({
+            "samples": samples,
+            "readings": readings,
+            "elapsed_s": elapsed,
+            "readings_per_s": readings / elapsed if elapsed > 0 else None,
+            "stages": timer.summary()
+        })
+    workdir.cleanup()
+    return {
+        "benchmark": "measurement_throughput",
+        "mode": mode,
+        "settle": "poll" if settle is None else settle,
+        "pair": pair,
+        "address": address,
+        "sim_options": sim_options or {},
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results
+    }
+
+
+def main(argv=None):
+    """
+    Usage: python benchmark.py [--mode gui|web] [--readings N] [--output FILE]
+           python benchmark.py --parse-bench
+           python benchmark.py --startup
+           python benchmark.py --metrics      # adds latency histograms to the report
+
+    Runs against the simulated SMU by default; pass --address to benchmark a
+    real device. "gui" mode opens the port once and reads continuously; "web"
+    mode repeats the full MEASURE press on a pooled (already open) session.
+    Rendering (Qt/Streamlit) is not included since it needs a display;
+    everything up to and including recording is.
+    """
+    parser = argparse.ArgumentParser(description="SMU measurement throughput benchmark")
+    parser.add_argument("--address", default=smu_utils.SIM_ADDRESS)
+    parser.add_argument("--mode", choices=["gui", "web"], default="gui")
+    parser.add_argument("--readings", type=int, default=50)
+    parser.add_argument("--filters", type=int, nargs="+", default=FILTER_SETTINGS)
+    parser.add_argument("--latency", type=float, default=0.002,
+                        help="Simulated per-command latency (s)")
+    parser.add_argument("--sample-time", type=float, default=20e-6,
+                        help="Simulated integration time per filter sample (s)")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="Scale all simulated delays (0 = no sleeping)")
+    parser.add_argument("--settle", type=float, default=None,
+                        help="Fixed settle delay in web mode (s); default polls settling.settle")
+    parser.add_argument("--pair", action="store_true",
+                        help="Read both channels with the combined measure_pair() "
+                             "(simulator only; real devices read them back-to-back)")
+    parser.add_argument("--parse-bench", action="store_true",
+                        help="Only benchmark response decoding (no device)")
+    parser.add_argument("--startup", action="store_true",
+                        help="Only benchmark cold import time of the entry points")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Collect instrumentation metrics and add them to the report")
+    parser.add_argument("--output", help="Write JSON report to this file")
+    args = parser.parse_args(argv)
+    if args.metrics:
+        instrumentation.enable()
+
+    sim_options = None
+    if args.address == smu_utils.SIM_ADDRESS:
+        sim_options = {"latency": args.latency, "sample_time": args.sample_time,
+                       "time_scale": args.time_scale, "seed": 0}
+
+    # get_session prints progress; keep stdout clean for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.parse_bench:
+            report = parse_benchmark()
+        elif args.startup:
+            report = startup_benchmark()
+        else:
+            report = run_benchmark(args.address, args.mode, args.filters, args.readings,
+                                   sim_options, args.settle, args.pair)
+    if args.metrics:
+        report["metrics"] = instrumentation.snapshot()
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,27 @@
-import xtralien
-import time
 import sys
-import numpy as np
 
-def run_diagnostics():
+import settling
+import smu_utils
+from smu_parse import parse_smu, parse_vsense
+
+def run_diagnostics(port="/dev/ttyACM0"):
     print("=== SMU DIAGNOSTICS ===")
-    port = "/dev/ttyACM0"
     
     print(f"1. Connecting to {port}...")
-    try:
-        device = xtralien.Device(port)
-        print("   Connected.")
-        print(f"   Hello Check: {device.cloi.hello().strip()}")
-    except Exception as e:
-        print(f"   FATAL: Could not connect ({e})")
+    # get_session performs the hello check (and accepts "sim")
+    device = smu_utils.get_session(port)
+    if not device:
+        print("   FATAL: Could not connect")
         return
+    print("   Connected.")
 
     print("\n2. Resetting Device...")
     try:
         device.smu1.set.enabled(False, response=0)
         device.vsense1.set.enabled(False, response=0)
         device.smu1.set.voltage(0, response=0)
-        time.sleep(1)
-        print("   Reset complete.")
+        settled = settling.settle_current(device, timeout=1.0)
+        print(f"   Reset complete (output settled in {settled['settle_time']*1000:.0f} ms).")
     except Exception as e:
         print(f"   Reset failed ({e})")
 
@@ -34,17 +33,15 @@ def run_diagnostics():
         target_v = 0.5
         print(f"   Setting Source Voltage to {target_v} V...")
         device.smu1.set.voltage(target_v, response=0)
-        time.sleep(0.5)
+        settled = settling.settle_current(device)
+        print(f"   Current settled in {settled['settle_time']*1000:.0f} ms"
+              + ("." if settled["settled"] else " (timeout)."))
         
         print("   Measuring SMU1...")
         data = device.smu1.measure()
         print(f"   Raw Data: {data}")
         
-        v_out, i_out = 0.0, 0.0
-        if data is not None:
-             arr = np.array(data).flatten()
-             if len(arr) >= 2:
-                 v_out, i_out = float(arr[0]), float(arr[1])
+        v_out, i_out = parse_smu(data)
         
         print(f"   Measured: V={v_out:.4f} V, I={i_out*1000:.4f} mA")
         
@@ -60,17 +57,15 @@ def run_diagnostics():
     try:
         print("   Enabling Vsense1...")
         device.vsense1.set.enabled(True, response=0)
-        time.sleep(0.5)
+        settled = settling.settle(device)
+        print(f"   V/I settled in {settled['settle_time']*1000:.0f} ms"
+              + ("." if settled["settled"] else " (timeout)."))
         
         print("   Measuring Vsense1...")
         v_data = device.vsense1.measure()
         print(f"   Raw Data: {v_data}")
         
-        v_in = 0.0
-        if v_data is not None:
-             arr = np.array(v_data).flatten()
-             if len(arr) > 0:
-                 v_in = float(arr[0])
+        v_in = parse_vsense(v_data)
                  
         print(f"   Measured Inner V={v_in:.4f} V")
         print("   Vsense Test Complete.")
@@ -91,4 +86,8 @@ def run_diagnostics():
     print("\n=== DIAGNOSTICS COMPLETE ===")
 
 if __name__ == "__main__":
-    run_diagnostics()
+    # Usage: python diagnostic_smu.py [port]   (use "sim" for the simulator)
+    if len(sys.argv) > 1:
+        run_diagnostics(sys.argv[1])
+    else:
+        run_diagnostics()
@@ -1,14 +1,27 @@
 import numpy as np
 
+import instrumentation
+from correction_factors import default_engine
+
+# Basic 4-point multiplier K = pi / ln(2) ~= 4.5324 (infinite sheet)
+K_INFINITE_SHEET = np.pi / np.log(2)
+
+# Column names accepted by calculate_metrics_batch when given a DataFrame
+BATCH_COLUMNS = ("voltage", "current", "geometry", "thickness_microns",
+                 "length", "width", "diameter", "spacing")
+
 class MeasurementLogic:
     """
     Handles calculations for Sheet Resistance, Resistivity, and Conductivity.
     Implements geometric correction factors for finite sample sizes.
     """
     
-    def __init__(self):
-        pass
+    def __init__(self, correction_engine=None):
+        # Correction factors only depend on geometry, so they are cached by
+        # the engine instead of being recomputed for every reading.
+        self.correction = correction_engine or default_engine
         
+    @instrumentation.timed("smu_metrics_seconds")
     def calculate_metrics(self, voltage, current, geometry, thickness_microns, 
                           length=0, width=0, diameter=0, spacing=1.27):
         """
@@ -49,89 +62,10 @@ class MeasurementLogic:
         # Infinite sheet: C = 1.0
         # Basic multiplier K = pi / ln(2) ~= 4.5324
         
-        K = np.pi / np.log(2) # 4.53236
-        
-        # Geometric Correction
-        # Based on "A Survey of Four-Point Probe Sheet Resistance Measurements" or generic textbooks.
-        # We will implement a simplified correction based on L/s or D/s ratios.
+        K = K_INFINITE_SHEET # 4.53236
         
-        C = 1.0
-        s = spacing
-        
-        try:
-            if geometry == "Rectangular":
-                # Use the smaller dimension to determine "narrowness" correction
-                # If sample is large (L, W >> s), C -> 1
-                # If sample is narrow strip, C decreases.
-                
-                # Simplified Model for finite width d (Smits 1958)
-                # d = min(length, width)
-                # ratio = d / s
-                
-                d = min(length, width) if (length > 0 and width > 0) else 100.0
-                ratio = d / s
-                
-                # Data table approximation for Rectangular correction (Finite Width)
-                # d/s:  1.0     2.0     3.0     4.0     >= 5.0
-                # C:    0.86    0.98    1.0     1.0     1.0
-                # (Very rough approx for "Lite" replication)
-                
-                # A better formula for finite width w (where line of probes is parallel to length):
-                # We'll use a widely used approximation for thin films:
-                # If w/s > 4, correction is negligible (C~1).
-                
-                if ratio < 4.0:
-                    # Generic decrease. 
-                    # Let's use Ossila's style logic: infinite sheet assumption is surprisingly robust.
-                    # But user wants "Calculations implemented".
-                    # Let's use a standard lookup-interpolation or function.
-                    # C(w/s) for infinite length:
-                    # 2ln2 / (ln(sinh(t/s) ... ) complex stuff.
-                    
-                    # Implementation of Smits (1958) Table 1 for Recangular:
-                    # w/s -> C
-                    # 1.0 -> 0.865
-                    # 2.0 -> 0.98
-                    # 3.0 -> 0.997
-                    # 4.0 -> 0.999
-                    
-                    # Let's do a simple interpolation for robustness
-                    x = [1.0, 2.0, 3.0, 4.0, 5.0]
-                    y = [0.865, 0.98, 0.997, 0.999, 1.0]
-                    if ratio < 1.0: 
-                         # Very narrow
-                         C = 0.865 * ratio # Linear decay approximation
-                    else:
-                         C = np.interp(ratio, x, y)
-                else:
-                    C = 1.0
-                
-            elif geometry == "Circular":
-                # Finite diameter D
-                d = diameter if diameter > 0 else 100.0
-                ratio = d / s
-                
-                # Smits 1958 Table 2 for Circular
-                # d/s -> C
-                # 3 -> 0.5
-                # 4 -> 0.64
-                # 10 -> 0.92
-                # Infinite -> 1.0
-                
-                # Ideally:
-                # C = 1 / (1 + (1 / (2*ln2)) * ln( ... ) )
-                
-                # Let's use interpolation again for stability
-                x = [3.0, 4.0, 5.0, 10.0, 20.0, 100.0]
-                y = [0.500, 0.646, 0.741, 0.926, 0.98, 1.0]
-                
-                if ratio < 3.0:
-                    C = 0.5 * (ratio / 3.0) # Decay
-                else:
-                    C = np.interp(ratio, x, y)
-                    
-        except Exception:
-            C = 1.0 # Fallback
+        # Geometric Correction (Smits 1958, see correction_factors.py)
+        C = self.correction.factor(geometry, length, width, diameter, spacing)
             
         # Final Rs
         # Rs = K * R * C
@@ -153,3 +87,87 @@ class MeasurementLogic:
             "resistance": resistance,
             "correction_factor": C
         }
+
+    def calculate_metrics_batch(self, voltage, current=None, geometry="Rectangular",
+                                thickness_microns=0.0, length=0, width=0, diameter=0,
+                                spacing=1.27):
+        """
+        Vectorized version of calculate_metrics for reprocessing whole runs.
+        
+        Every argument may be a scalar or an array; scalars are broadcast
+        against the others so geometry can be given once or per row.
+        Results are identical to calling calculate_metrics row by row,
+        including the current == 0 and resistivity <= 0 edge cases.
+        
+        Args:
+            voltage (array-like or DataFrame): Measured voltages in Volts. If a
+                pandas DataFrame is given, its columns are used instead of the
+                other arguments (see BATCH_COLUMNS); missing columns fall back
+                to the keyword defaults.
+            current (array-like): Measured currents in Amps.
+            geometry (str or array-like): 'Rectangular' or 'Circular' per row.
+            thickness_microns (float or array-like): Sample thickness in microns.
+            length (float or array-like): Length in mm.
+            width (float or array-like): Width in mm.
+            diameter (float or array-like): Diameter in mm.
+            spacing (float or array-like): Probe spacing in mm.
+            
+        Returns:
+            dict: Same keys as calculate_metrics, each mapped to a float64 array.
+        """
+        if hasattr(voltage, "columns"):
+            frame = voltage
+            defaults = {
+                "current": current, "geometry": geometry,
+                "thickness_microns": thickness_microns, "length": length,
+                "width": width, "diameter": diameter, "spacing": spacing
+            }
+            cols = {}
+            for name in BATCH_COLUMNS:
+                if name in frame.columns:
+                    cols[name] = frame[name].to_numpy()
+                else:
+                    cols[name] = defaults.get(name)
+            if cols["voltage"] is None:
+                raise ValueError("DataFrame input needs a 'voltage' column.")
+            if cols["current"] is None:
+                raise ValueError("DataFrame input needs a 'current' column.")
+            voltage = cols["voltage"]
+            current = cols["current"]
+            geometry = cols["geometry"]
+            thickness_microns = cols["thickness_microns"]
+            length = cols["length"]
+            width = cols["width"]
+            diameter = cols["diameter"]
+            spacing = cols["spacing"]
+        elif current is None:
+            raise ValueError("current is required unless a DataFrame is given.")
+
+        v, i, t, L, W, D, s = np.broadcast_arrays(
+            *[np.asarray(a, dtype=float) for a in
+              (voltage, current, thickness_microns, length, width, diameter, spacing)]
+        )
+        geom = np.broadcast_to(np.asarray(geometry, dtype=object), v.shape)
+
+        C = self.correction.factor_batch(geom, L, W, D, s)
+
+        # Rows with zero current are reported as all zeros (C = 1.0)
+        zero_current = (i == 0)
+        safe_i = np.where(zero_current, 1.0, i)
+        resistance = np.where(zero_current, 0.0, v / safe_i)
+        C = np.where(zero_current, 1.0, C)
+
+        sheet_resistance = K_INFINITE_SHEET * resistance * C
+        resistivity = sheet_resistance * (t * 1e-6)
+
+        positive = resistivity > 0
+        conductivity = np.zeros(v.shape)
+        np.divide(1.0, resistivity, out=conductivity, where=positive)
+
+        return {
+            "sheet_resistance": sheet_resistance,
+            "resistivity": resistivity,
+            "conductivity": conductivity,
+            "resistance": resistance,
+            "correction_factor": C
+        }
@@ -1,5 +1,4 @@
 import sys
-import os
 import time
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QGridLayout, QLabel, QLineEdit, QComboBox, QSpinBox, 
@@ -8,15 +7,30 @@ from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QH
 from PyQt6.QtCore import Qt, QTimer, QSize
 from PyQt6.QtGui import QFont, QIcon
 
+import instrumentation
 import smu_utils
+import adaptive
+from resilient import ResilientSession
+from acquisition import AcquisitionWorker, read_reading
+from port_discovery import PortDiscovery, ADDED, REMOVED, IDENTIFIED
 from gui_logic import MeasurementLogic
+from recorder import StreamingRecorder
+
+# Labels are repainted at this rate; acquisition runs independently in a
+# worker thread as fast as the selected filter depth allows.
+DISPLAY_INTERVAL_MS = 100
+ACQUISITION_INTERVAL = 0.0
+PORT_POLL_MS = 1000        # How often hot-plug events are picked up
+
+# Column order matches the user's legacy results files
+RESULT_COLUMNS = ["Current (A)", "Voltage (V)", "Sheet Resistance (Ohm/square)"]
 
 class OssilaGUI(QMainWindow):
     def __init__(self):
         super().__init__()
         
         self.setWindowTitle("GU Lab Sheet Resistance Lite v1.0.3 (Restored)")
-        self.setGeometry(100, 100, 1060, 680)
+        self.setGeometry(100, 100, 1060, 900)
         
         # Load Stylesheet
         try:
@@ -29,6 +43,18 @@ class OssilaGUI(QMainWindow):
         self.logic = MeasurementLogic()
         self.device = None
         self.is_measuring = False
+        self.is_recording = False
+        self.recorder = None
+        self.adaptive_target = None   # Relative target when Samples = Adaptive
+        self.adaptive_filter = None   # Depth chosen by the last adaptive reading
+        self.adaptive_next = None     # Depth the next adaptive reading starts at
+        self.logged_filter = None
+        self.logged_reconnects = 0
+        
+        # Port discovery: cached enumeration, hot-plug events and background
+        # cloi.hello() probes (the port we have open is never probed)
+        self.active_port = None
+        self.discovery = PortDiscovery(is_busy=lambda port: port == self.active_port)
         
         # Main Layout
         central_widget = QWidget()
@@ -51,7 +77,8 @@ class OssilaGUI(QMainWindow):
         self.refresh_btn.setFixedSize(25, 25)
         self.refresh_btn.clicked.connect(self.refresh_ports)
         self.port_combo = QComboBox()
-        self.refresh_ports()
+        self.update_port_list()
+        self.discovery.drain_events() # Initial "added" events are not news
         addr_row.addWidget(self.refresh_btn)
         addr_row.addWidget(self.port_combo)
         sidebar_layout.addLayout(addr_row)
@@ -108,8 +135,9 @@ class OssilaGUI(QMainWindow):
         # Samples per point
         adv_layout.addWidget(QLabel("Samples per Point"), 1, 0)
         self.samples_combo = QComboBox()
-        self.samples_combo.addItems(["64", "256", "1024", "4096", "8192"])
+        self.samples_combo.addItems(["64", "256", "1024", "4096", "8192", "Adaptive"])
         self.samples_combo.setCurrentText("8192")
+        self.samples_combo.currentTextChanged.connect(self.update_adaptive_fields)
         adv_layout.addWidget(self.samples_combo, 1, 1)
         
         # Current Range
@@ -133,6 +161,13 @@ class OssilaGUI(QMainWindow):
         self.ilim_spin = self.create_spinbox(220.00, "Current Limit", 500.0)
         adv_layout.addWidget(self.ilim_spin, 5, 1)
 
+        # Adaptive sampling target (only used when Samples per Point = Adaptive)
+        self.lbl_precision = QLabel("Target Precision (%)")
+        adv_layout.addWidget(self.lbl_precision, 6, 0)
+        self.precision_spin = self.create_spinbox(0.100, "Target Precision", 10.0, decimals=3)
+        adv_layout.addWidget(self.precision_spin, 6, 1)
+        self.update_adaptive_fields()
+
         sidebar_layout.addWidget(self.adv_widget)
         self.toggle_advanced(False) 
         
@@ -201,6 +236,14 @@ class OssilaGUI(QMainWindow):
         bot_layout.addWidget(self.lbl_volt_in_widget)
         
         center_layout.addWidget(bot_panel, stretch=2)
+        
+        # Trend Panel (decimated live plot of the whole run). pyqtgraph is
+        # slow to import, so the panel is built once the window is showing.
+        self.trend = None
+        self.trend_slot = QVBoxLayout()
+        self.trend_slot.setContentsMargins(0, 0, 0, 0)
+        center_layout.addLayout(self.trend_slot, stretch=3)
+        QTimer.singleShot(0, self.load_trend_panel)
         main_layout.addWidget(center_widget)
         
         # --- RIGHT SIDEBAR (Log) ---
@@ -219,6 +262,14 @@ class OssilaGUI(QMainWindow):
         save_layout.addWidget(save_btn)
         right_layout.addLayout(save_layout)
         
+        format_layout = QHBoxLayout()
+        format_layout.addWidget(QLabel("Save Format"))
+        self.format_combo = QComboBox()
+        self.format_combo.addItems(["CSV", "Binary Run"])
+        self.format_combo.setCurrentText("CSV")
+        format_layout.addWidget(self.format_combo)
+        right_layout.addLayout(format_layout)
+        
         self.log_area = QTextEdit()
         self.log_area.setObjectName("Log") 
         self.log_area.setReadOnly(True)
@@ -234,9 +285,16 @@ class OssilaGUI(QMainWindow):
         
         main_layout.addWidget(right_sidebar)
         
-        # Timer
+        # Display Timer (the device is polled by self.worker, not the UI thread)
+        self.worker = None
         self.timer = QTimer()
         self.timer.timeout.connect(self.measurement_loop)
+        
+        # Hot-plug events are polled on the UI thread
+        self.discovery.start()
+        self.port_timer = QTimer()
+        self.port_timer.timeout.connect(self.poll_port_events)
+        self.port_timer.start(PORT_POLL_MS)
     
     # ... helpers ...
     def update_geometry_fields(self):
@@ -256,8 +314,18 @@ class OssilaGUI(QMainWindow):
             self.diam_spin.setVisible(True)
             self.lbl_diam.setVisible(True)
             
+    def load_trend_panel(self):
+        from trend_plot import TrendPlot
+        self.trend = TrendPlot()
+        self.trend_slot.addWidget(self.trend)
+
     def toggle_advanced(self, checked):
         self.adv_widget.setVisible(checked)
+
+    def update_adaptive_fields(self):
+        is_adaptive = self.samples_combo.currentText() == "Adaptive"
+        self.lbl_precision.setVisible(is_adaptive)
+        self.precision_spin.setVisible(is_adaptive)
         
     def reset_defaults(self):
         self.log("Resetting to defaults...")
@@ -272,6 +340,7 @@ class OssilaGUI(QMainWindow):
         self.polar_combo.setCurrentText("Positive")
         self.vlim_spin.setValue(10.50)
         self.ilim_spin.setValue(220.00)
+        self.precision_spin.setValue(0.100)
         self.save_spin.setValue(50)
 
     def create_spinbox(self, value, name, max_val=1000.0, decimals=2):
@@ -309,13 +378,50 @@ class OssilaGUI(QMainWindow):
         self.log_area.append(f"{timestamp}: {message}")
         
     def refresh_ports(self):
-        self.port_combo.clear()
-        import serial.tools.list_ports
-        ports = serial.tools.list_ports.comports()
-        port_list = [p.device for p in ports]
+        # Rescan now (in the background) and re-probe anything new
+        self.discovery.refresh(wait=False)
+        self.update_port_list()
+        
+    def update_port_list(self, auto_select=False):
+        """
+        Rebuilds the port dropdown from the discovery cache (no I/O), keeping
+        the current choice unless `auto_select` finds a better one.
+        """
+        current = self.port_combo.currentText()
+        port_list = self.discovery.ports()
         if "/dev/ttyACM0" not in port_list: port_list.append("/dev/ttyACM0")
         if "/dev/ttyUSB0" not in port_list: port_list.append("/dev/ttyUSB0")
+        port_list.append(smu_utils.SIM_ADDRESS)
+        
+        choice = current
+        if auto_select and current != smu_utils.SIM_ADDRESS:
+            choice = self.discovery.best_port(preferred=current) or current
+        
+        self.port_combo.blockSignals(True)
+        self.port_combo.clear()
         self.port_combo.addItems(port_list)
+        for i, port in enumerate(port_list):
+            info = self.discovery.info(port) or {}
+            state = {True: "SMU", False: "not an SMU", None: "probing..."}.get(info.get("smu"), "")
+            tip = " — ".join(t for t in (self.discovery.description(port), state) if t)
+            if tip:
+                self.port_combo.setItemData(i, tip, Qt.ItemDataRole.ToolTipRole)
+        if choice in port_list:
+            self.port_combo.setCurrentText(choice)
+        self.port_combo.blockSignals(False)
+        
+    def poll_port_events(self):
+        events = self.discovery.drain_events()
+        if not events: return
+        for event in events:
+            if event.kind == ADDED:
+                self.log(f"Port connected: {event.port}")
+            elif event.kind == REMOVED:
+                self.log(f"Port removed: {event.port}")
+            elif event.kind == IDENTIFIED and event.info.get("smu"):
+                self.log(f"SMU found on {event.port}")
+        # Never switch ports under a running measurement
+        self.update_port_list(auto_select=not self.is_measuring)
         
     def toggle_power(self, checked):
         if checked:
@@ -335,21 +441,30 @@ class OssilaGUI(QMainWindow):
                  try: self.device.close()
                  except: pass
                  
-             self.device = smu_utils.get_session(port, 'usb')
-             if not self.device:
-                 raise Exception("Connection failed")
+             # Retries failed reads and reopens the port on USB errors,
+             # restoring the applied settings (cached set.* writes).
+             self.device = ResilientSession(port, 'usb').connect()
+             self.logged_reconnects = 0
+             self.active_port = port
              
              # Setup SMU
              self.device.smu1.set.enabled(True, response=0)
              self.device.smu1.set.limitv(user_v_limit, response=0)
              self.device.smu1.set.limiti(user_i_limit, response=0)
              
-             # Advanced: Samples
-             try:
-                 samples = int(self.samples_combo.currentText())
-                 self.device.smu1.set.filter(samples, response=0)
-                 self.device.vsense1.set.filter(samples, response=0)
-             except: pass
+             # Advanced: Samples (Adaptive picks the filter per reading)
+             self.adaptive_target = None
+             self.adaptive_filter = None
+             self.adaptive_next = None
+             self.logged_filter = None
+             if self.samples_combo.currentText() == "Adaptive":
+                 self.adaptive_target = max(self.precision_spin.value(), 0.001) / 100
+             else:
+                 try:
+                     samples = int(self.samples_combo.currentText())
+                     self.device.smu1.set.filter(samples, response=0)
+                     self.device.vsense1.set.filter(samples, response=0)
+                 except: pass
              
              # Polarity
              polarity_mult = 1.0
@@ -369,15 +484,28 @@ class OssilaGUI(QMainWindow):
              
              self.log(f"Measurement started (Source: {drive_v}V).")
              self.is_measuring = True
-             self.timer.start(500) 
+             if self.trend: self.trend.clear()
+             self.worker = AcquisitionWorker(self.read_device, interval=ACQUISITION_INTERVAL)
+             self.worker.start()
+             self.timer.start(DISPLAY_INTERVAL_MS)
              
         except Exception as e:
             self.log(f"Error: {e}")
             self.power_btn.setChecked(False)
             
     def stop_measurement(self):
+        self.timer.stop()
+        if self.worker:
+            # Let the in-flight read finish before touching the port again
+            if not self.worker.stop(timeout=5.0):
+                self.log("Warning: acquisition thread did not stop in time.")
+            self.worker = None
         if self.device:
             self.log("Stopping measurement...")
+            stats = self.device.stats()
+            if stats["retries"]:
+                self.log(f"Link recovered {stats['retries']} time(s) "
+                         f"({stats['reconnects']} reconnect(s), {stats['failures']} failed read(s)).")
             try:
                 self.device.smu1.set.voltage(0, response=0)
                 self.device.smu1.set.enabled(False, response=0)
@@ -385,96 +513,154 @@ class OssilaGUI(QMainWindow):
                 self.device.close()
             except: pass
             self.device = None
+            self.active_port = None
         self.is_measuring = False
-        self.timer.stop()
+        if self.is_recording:
+            # Keep the partial run rather than discarding it
+            self.finish_recording()
         self.log("Measurement finished.")
         
+    def read_device(self):
+        """
+        One blocking acquisition. Runs on the worker thread, so it must not
+        touch any widgets.
+        """
+        if self.adaptive_target:
+            # Start where the last reading converged, not at the shallowest depth
+            result = self.device.call(lambda device: adaptive.measure_adaptive(
+                device, self.adaptive_target, start_depth=self.adaptive_next))
+            self.adaptive_filter = result["filter"]
+            self.adaptive_next = result["next_filter"]
+            return result["reading"]
+        return self.device.call(read_reading)
+        
     def measurement_loop(self):
-        if not self.device or not self.is_measuring: return
-        try:
-            v_data = self.device.vsense1.measure()
-            smu_data = self.device.smu1.measure()
-            
-            v_inner = 0.0
-            i_outer = 0.0
-            v_outer = 0.0
-            import numpy as np
-            
-            if v_data is not None:
-                v_arr = np.array(v_data).flatten()
-                if len(v_arr) > 0:
-                     try:
-                         val = str(v_arr[0]).strip()
-                         if val: v_inner = float(val)
-                     except: pass
-            
-            if smu_data is not None:
-                smu_arr = np.array(smu_data).flatten()
-                if len(smu_arr) >= 2:
-                    try:
-                        val_v = str(smu_arr[0]).strip()
-                        val_i = str(smu_arr[1]).strip()
-                        if val_v: v_outer = float(val_v)
-                        if val_i: i_outer = float(val_i)
-                    except: pass
-            
-            thick_um = self.thick_spin.value()
-            geom = self.geom_combo.currentText()
+        """
+        Display tick: drains readings queued by the worker, records all of
+        them and repaints the labels once with the latest one.
+        """
+        if not self.worker or not self.is_measuring: return
+        items = self.worker.drain()
+        if not items: return
+        
+        thick_um = self.thick_spin.value()
+        geom = self.geom_combo.currentText()
+        geometry = dict(
+            length=self.long_spin.value(), width=self.short_spin.value(), 
+            diameter=self.diam_spin.value(), spacing=self.spacing_spin.value()
+        )
+        
+        if self.adaptive_target and self.adaptive_filter != self.logged_filter:
+            self.logged_filter = self.adaptive_filter
+            self.log(f"Adaptive sampling: filter depth {self.adaptive_filter}")
+        
+        if self.device.reconnects != self.logged_reconnects:
+            self.logged_reconnects = self.device.reconnects
+            self.log(f"Connection lost and restored ({self.logged_reconnects} reconnect(s); "
+                     f"last error: {self.device.last_error}).")
+        
+        latest = None
+        for reading in items:
+            if isinstance(reading, Exception):
+                self.log(f"Read error: {reading}")
+                continue
             metrics = self.logic.calculate_metrics(
-                v_inner, i_outer, geom, thick_um, 
-                length=self.long_spin.value(), width=self.short_spin.value(), 
-                diameter=self.diam_spin.value(), spacing=self.spacing_spin.value()
+                reading.v_inner, reading.i_outer, geom, thick_um, **geometry
             )
+            latest = (reading, metrics)
+            if self.trend: self.trend.append(reading, metrics)
             
             # Recording
-            if hasattr(self, 'is_recording') and self.is_recording:
-                 self.data_buffer.append({
-                     "Current (A)": i_outer,
-                     "Voltage (V)": v_inner, # Matches old legacy format named "Voltage (V)"
-                     "Sheet Resistance (Ohm/square)": metrics['sheet_resistance']
+            if self.is_recording:
+                 # Each writer picks the keys for its own columns
+                 self.recorder.append({
+                     "Current (A)": reading.i_outer,
+                     "Voltage (V)": reading.v_inner, # Matches old legacy format named "Voltage (V)"
+                     "Sheet Resistance (Ohm/square)": metrics['sheet_resistance'],
+                     "timestamp": reading.timestamp,
+                     "v_inner": reading.v_inner,
+                     "v_outer": reading.v_outer,
+                     "i_outer": reading.i_outer,
+                     "sheet_resistance": metrics['sheet_resistance'],
+                     "resistivity": metrics['resistivity'],
+                     "conductivity": metrics['conductivity']
                  })
-                 remaining = self.points_to_save - len(self.data_buffer)
-                 if remaining <= 0:
-                     self.save_buffer_to_file()
-                 else:
-                     self.log(f"Recording... {len(self.data_buffer)}")
+                 if self.points_to_save - self.recorder.count <= 0:
+                     self.finish_recording()
                      
-            self.lbl_sheet_res.setText(f"{metrics['sheet_resistance']:.3f}")
-            self.lbl_resistivity.setText(f"{metrics['resistivity']*1e6:.2f}") 
-            self.lbl_conductivity.setText(f"{metrics['conductivity']*1e-3:.4f}") 
-            self.lbl_volt_out.setText(f"{v_outer*1000:.2f}") 
-            self.lbl_curr_out.setText(f"{i_outer*1000:.4f}") 
-            self.lbl_volt_in.setText(f"{v_inner*1000:.2f}") 
-                
-        except Exception as e:
-            self.log(f"Read error: {e}")
+        if self.is_recording:
+            self.log(f"Recording... {self.recorder.count}")
+            
+        if latest is None: return
+        if self.trend: self.trend.refresh()
+        reading, metrics = latest
+        self.lbl_sheet_res.setText(f"{metrics['sheet_resistance']:.3f}")
+        self.lbl_resistivity.setText(f"{metrics['resistivity']*1e6:.2f}") 
+        self.lbl_conductivity.setText(f"{metrics['conductivity']*1e-3:.4f}") 
+        self.lbl_volt_out.setText(f"{reading.v_outer*1000:.2f}") 
+        self.lbl_curr_out.setText(f"{reading.i_outer*1000:.4f}") 
+        self.lbl_volt_in.setText(f"{reading.v_inner*1000:.2f}") 
 
     def start_recording(self):
         if not self.is_measuring:
             self.log("Error: Start measurement first.")
             return
+        if self.is_recording:
+            self.finish_recording()
         self.points_to_save = self.save_spin.value()
-        self.data_buffer = []
+        try:
+            # Rows are streamed to disk as they arrive, so a crash keeps
+            # everything up to the last flushed chunk.
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
+            if self.format_combo.currentText() == "Binary Run":
+                from runfile import RunWriter, RUN_COLUMNS
+                filename = f"results/measurement_{timestamp}.smurun"
+                self.recorder = RunWriter(filename, RUN_COLUMNS, config=self.current_config())
+            else:
+                filename = f"results/measurement_{timestamp}.csv"
+                self.recorder = StreamingRecorder(filename, RESULT_COLUMNS, chunk_size=16)
+        except Exception as e:
+            self.log(f"Save error: {e}")
+            return
         self.is_recording = True
         self.log(f"Started recording {self.points_to_save} points...")
         
-    def save_buffer_to_file(self):
+    def current_config(self):
+        """
+        Geometry and acquisition settings stored alongside binary runs.
+        """
+        return {
+            "geometry": self.geom_combo.currentText(),
+            "length_mm": self.long_spin.value(),
+            "width_mm": self.short_spin.value(),
+            "diameter_mm": self.diam_spin.value(),
+            "thickness_um": self.thick_spin.value(),
+            "spacing_mm": self.spacing_spin.value(),
+            "samples": self.samples_combo.currentText(),
+            "target_precision_pct": self.precision_spin.value(),
+            "polarity": self.polar_combo.currentText(),
+            "limit_v": self.vlim_spin.value(),
+            "limit_i_ma": self.ilim_spin.value(),
+            "port": self.port_combo.currentText()
+        }
+        
+    def finish_recording(self):
         self.is_recording = False
-        self.log("Recording complete. Saving...")
+        if not self.recorder: return
         try:
-            import pandas as pd
-            if not os.path.exists("results"): os.makedirs("results")
-            timestamp = time.strftime("%Y%m%d_%H%M%S")
-            filename = f"results/measurement_{timestamp}.csv"
-            df = pd.DataFrame(self.data_buffer)
-            # Ensure column order matches user's legacy file
-            df = df[["Current (A)", "Voltage (V)", "Sheet Resistance (Ohm/square)"]]
-            df.to_csv(filename, index=False)
-            self.log(f"Saved: {filename}")
+            self.recorder.close()
+            self.log(f"Recording complete. Saved: {self.recorder.path}")
         except Exception as e:
             self.log(f"Save error: {e}")
+        self.recorder = None
+
+    def closeEvent(self, event):
+        self.port_timer.stop()
+        self.discovery.stop()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
+    instrumentation.autostart()  # SMU_METRICS_PORT / SMU_METRICS_JSON, if set
     app = QApplication(sys.argv)
     window = OssilaGUI()
     window.show()
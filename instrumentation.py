@@ -0,0 +1,345 @@
+import atexit
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+# Metrics are off unless SMU_METRICS=1 (or an export is configured, see
+# autostart). While off, every hook below returns after one global check.
+ENABLED = os.environ.get("SMU_METRICS", "").lower() not in ("", "0", "false", "no")
+
+# Latency buckets (seconds): 10 µs ... 10 s, roughly 1-2.5-5 per decade
+BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DEFAULT_PORT = 9464   # Conventional Prometheus exporter port range
+
+# HELP text for the exported metrics
+HELP = {
+    "smu_connect_seconds": "Time to open an SMU session (get_session).",
+    "smu_connect_errors_total": "Failed get_session attempts.",
+    "smu_set_total": "set.* commands, by channel, setting and result (sent/skipped).",
+    "smu_set_seconds": "Round-trip time of set.* commands that reached the device.",
+    "smu_set_errors_total": "set.* commands that raised, by channel and setting.",
+    "smu_command_seconds": "Round-trip time of other channel commands (measure, sweep, ...).",
+    "smu_command_errors_total": "Channel commands that raised.",
+    "smu_read_seconds": "Time for one four-point reading (read_reading).",
+    "smu_read_errors_total": "Readings that raised.",
+    "smu_parse_seconds": "Time to decode a measurement reply pair.",
+    "smu_parse_errors_total": "Replies that could not be decoded.",
+    "smu_metrics_seconds": "Time spent in calculate_metrics.",
+    "smu_metrics_errors_total": "calculate_metrics calls that raised.",
+    "smu_file_write_seconds": "Time to flush buffered rows to disk, by writer.",
+    "smu_file_write_errors_total": "Failed flushes, by writer.",
+    "smu_rows_written_total": "Rows flushed to disk, by writer.",
+    "smu_retries_total": "Retried SMU operations, by error kind.",
+    "smu_reconnects_total": "Ports reopened after a transport error.",
+}
+
+_lock = threading.Lock()
+_counters = {}     # (name, labels) -> value
+_histograms = {}   # (name, labels) -> [bucket counts..., +Inf count, sum]
+_started = time.time()
+_exporters = {}
+
+
+def enable(on=True):
+    """
+    Turns collection on or off at runtime (already collected values are kept).
+    """
+    global ENABLED
+    ENABLED = bool(on)
+
+
+def reset():
+    """
+    Clears every counter and histogram.
+    """
+    global _started
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _started = time.time()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+def count(name, n=1, **labels):
+    """
+    Adds `n` to a counter.
+    """
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+
+def observe(name, seconds, **labels):
+    """
+    Records one duration in a histogram.
+    """
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    index = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        hist[index] += 1
+        hist[-1] += seconds
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+        if exc_type is not None and issubclass(exc_type, Exception):
+            count(_error_name(self.name), **self.labels)
+        return False
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def _error_name(name):
+    base = name[:-len("_seconds")] if name.endswith("_seconds") else name
+    return base + "_errors_total"
+
+
+def timer(name, **labels):
+    """
+    Context manager timing a block into histogram `name`. An exception in
+    the block also bumps `<name without _seconds>_errors_total`.
+
+    Example:
+        with instrumentation.timer("smu_connect_seconds"):
+            ...
+    """
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(name, labels)
+
+
+def timed(name, **labels):
+    """
+    Decorator version of timer(). While disabled the wrapper only adds one
+    global check and a call (well under a microsecond).
+    """
+    errors = _error_name(name)
+
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                count(errors, **labels)
+                raise
+            finally:
+                observe(name, time.perf_counter() - start, **labels)
+        return wrapper
+    return decorate
+
+
+# --- export ---
+def snapshot():
+    """
+    Current values as a JSON-friendly dict.
+
+    Returns:
+        dict: {"timestamp", "uptime_s", "counters": {name: [{"labels", "value"}]},
+               "histograms": {name: [{"labels", "count", "sum", "mean",
+               "buckets": {le: cumulative count}}]}}
+    """
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+    out = {"timestamp": time.time(), "uptime_s": time.time() - _started,
+           "counters": {}, "histograms": {}}
+    for (name, labels), value in sorted(counters.items()):
+        out["counters"].setdefault(name, []).append({"labels": dict(labels), "value": value})
+    for (name, labels), hist in sorted(histograms.items()):
+        n = sum(hist[:-1])
+        cumulative, buckets = 0, {}
+        for le, c in zip(BUCKETS, hist):
+            cumulative += c
+            buckets[str(le)] = cumulative
+        buckets["+Inf"] = n
+        out["histograms"].setdefault(name, []).append({
+            "labels": dict(labels), "count": n, "sum": hist[-1],
+            "mean": hist[-1] / n if n else None, "buckets": buckets
+        })
+    return out
+
+
+def _label_text(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in items) + "}"
+
+
+def render_prometheus():
+    """
+    Current values in the Prometheus text exposition format.
+    """
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+    lines = []
+    seen = set()
+    for (name, labels), value in sorted(counters.items()):
+        if name not in seen:
+            seen.add(name)
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_label_text(labels)} {value}")
+    for (name, labels), hist in sorted(histograms.items()):
+        if name not in seen:
+            seen.add(name)
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for le, c in zip(BUCKETS, hist):
+            cumulative += c
+            lines.append(f"{name}_bucket{_label_text(labels, ('le', repr(le)))} {cumulative}")
+        total = sum(hist[:-1])
+        lines.append(f"{name}_bucket{_label_text(labels, ('le', '+Inf'))} {total}")
+        lines.append(f"{name}_sum{_label_text(labels)} {hist[-1]!r}")
+        lines.append(f"{name}_count{_label_text(labels)} {total}")
+    return "\n".join(lines) + "\n"
+
+
+def dump_json(path):
+    """
+    Writes snapshot() to `path` (atomically, so readers never see half a file).
+    """
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot(), f, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def serve(port=DEFAULT_PORT, host="127.0.0.1"):
+    """
+    Serves /metrics (Prometheus text) and /metrics.json on a daemon thread.
+
+    Returns:
+        http.server.ThreadingHTTPServer: Call shutdown() to stop it.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path in ("/", "/metrics"):
+                body, ctype = render_prometheus(), "text/plain; version=0.0.4"
+            elif path == "/metrics.json":
+                body, ctype = json.dumps(snapshot()), "application/json"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass  # Scrapes every few seconds would flood the console
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    print(f"Metrics at http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def start_json_dump(path, interval=10.0):
+    """
+    Rewrites `path` with snapshot() every `interval` seconds on a daemon thread.
+
+    A final dump is written when the process exits, so short runs (e.g.
+    batch_runner.py) still leave their numbers behind.
+
+    Returns:
+        threading.Event: Set it to stop the periodic dumps.
+    """
+    stop = threading.Event()
+
+    def dump():
+        try:
+            dump_json(path)
+        except OSError as e:
+            print(f"Metrics dump failed: {e}")
+
+    def run():
+        while not stop.wait(interval):
+            dump()
+
+    threading.Thread(target=run, daemon=True, name="metrics-json").start()
+    atexit.register(dump)
+    return stop
+
+
+def autostart():
+    """
+    Starts the exports configured in the environment (once per process):
+
+        SMU_METRICS=1              collect metrics
+        SMU_METRICS_PORT=9464      serve /metrics and /metrics.json
+        SMU_METRICS_JSON=path      dump JSON every SMU_METRICS_INTERVAL s (10)
+
+    Configuring an export also turns collection on.
+
+    Returns:
+        dict: The exporters started so far ({"http": server, "json": stop event}).
+    """
+    with _lock:
+        if _exporters:
+            return _exporters
+        port = os.environ.get("SMU_METRICS_PORT")
+        path = os.environ.get("SMU_METRICS_JSON")
+        try:
+            if port:
+                _exporters["http"] = serve(int(port))
+            if path:
+                interval = float(os.environ.get("SMU_METRICS_INTERVAL", "10"))
+                _exporters["json"] = start_json_dump(path, interval)
+        except (OSError, ValueError) as e:
+            print(f"Metrics export not started: {e}")
+    if _exporters:
+        enable()
+    return _exporters
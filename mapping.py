@@ -0,0 +1,269 @@
+import math
+
+import numpy as np
+
+from acquisition import Reading, read_reading
+
+# Per-site columns kept by SiteMap (and written by SiteMap.save_csv)
+SITE_COLUMNS = ["sample_id", "x", "y", "timestamp", "v_inner", "v_outer", "i_outer",
+                "sheet_resistance", "resistivity", "conductivity", "readings"]
+_VALUE_COLUMNS = SITE_COLUMNS[3:]
+
+
+def grid_positions(nx, ny, pitch_x, pitch_y=None, origin=(0.0, 0.0), serpentine=True,
+                   diameter=None, edge_exclusion=0.0):
+    """
+    Probe positions (mm) for a rectangular grid, optionally clipped to a wafer.
+
+    Args:
+        nx, ny (int): Number of columns and rows.
+        pitch_x, pitch_y (float): Site spacing in mm (pitch_y defaults to pitch_x).
+        origin (tuple): Centre of the grid.
+        serpentine (bool): Reverse every other row so the probe never makes a
+            long return move.
+        diameter (float): If given, drop sites outside a circle of this
+            diameter (minus `edge_exclusion`) centred on `origin`.
+
+    Returns:
+        list: [(x, y), ...] in measurement order.
+    """
+    pitch_y = pitch_x if pitch_y is None else pitch_y
+    xs = origin[0] + (np.arange(nx) - (nx - 1) / 2) * pitch_x
+    ys = origin[1] + (np.arange(ny) - (ny - 1) / 2) * pitch_y
+    limit = None if diameter is None else diameter / 2 - edge_exclusion
+    positions = []
+    for row, y in enumerate(ys):
+        cols = xs[::-1] if serpentine and row % 2 else xs
+        for x in cols:
+            if limit is not None and math.hypot(x - origin[0], y - origin[1]) > limit:
+                continue
+            positions.append((round(float(x), 6), round(float(y), 6)))
+    return positions
+
+
+def average_reading(device, n=4, read_fn=read_reading):
+    """
+    Mean of `n` readings at one site.
+
+    Returns:
+        Reading: Averaged values, stamped at the mean timestamp.
+    """
+    readings = [read_fn(device) for _ in range(max(int(n), 1))]
+    return Reading(*(float(np.mean(col)) for col in zip(*readings)))
+
+
+class UniformityStats:
+    """
+    Running mean / std / min / max of one quantity (Welford's algorithm).
+
+    Values can be removed again (a re-measured site replaces its old value).
+    Removing the current min or max marks them stale; pass `values` to
+    summary() to recompute them in that case.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._extremes_stale = False
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def remove(self, value):
+        if self.count <= 1:
+            self.__init__()
+            return
+        delta = value - self.mean
+        self.mean = (self.count * self.mean - value) / (self.count - 1)
+        self.count -= 1
+        self._m2 = max(self._m2 - delta * (value - self.mean), 0.0)
+        if value <= self.min or value >= self.max:
+            self._extremes_stale = True
+
+    @property
+    def std(self):
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def summary(self, values=None):
+        """
+        Returns:
+            dict: count, mean, std, min, max and two non-uniformity figures:
+                  "non_uniformity_pct" = std / mean * 100 (1-sigma) and
+                  "range_pct" = (max - min) / (max + min) * 100.
+        """
+        if self._extremes_stale and values is not None:
+            values = np.asarray(values, dtype=float)
+            self.min = float(values.min()) if len(values) else math.inf
+            self.max = float(values.max()) if len(values) else -math.inf
+            self._extremes_stale = False
+        if not self.count:
+            return {"count": 0, "mean": None, "std": None, "min": None, "max": None,
+                    "non_uniformity_pct": None, "range_pct": None}
+        span = self.max + self.min
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "std": self.std,
+            "min": self.min,
+            "max": self.max,
+            "non_uniformity_pct": self.std / abs(self.mean) * 100 if self.mean else None,
+            "range_pct": (self.max - self.min) / abs(span) * 100 if span else None
+        }
+
+
+class SiteMap:
+    """
+    Results keyed by (sample_id, x, y).
+
+    Values live in growable column arrays (one row per site) with a dict from
+    key to row, so adding a site is O(1) and heatmap grids are built with
+    vectorised NumPy lookups even for thousands of sites. Re-measuring a site
+    overwrites its row. Sheet-resistance statistics per sample are kept up to
+    date incrementally (UniformityStats).
+    """
+
+    def __init__(self, capacity=1024):
+        self._rows = {}
+        self._samples = []
+        self._sample_ids = np.zeros(capacity, dtype=np.int32)
+        self._xy = np.zeros((capacity, 2))
+        self._values = np.zeros((capacity, len(_VALUE_COLUMNS)))
+        self._stats = {}
+        self.revision = 0   # Bumped on every change; handy as a redraw cache key
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _grow(self):
+        capacity = 2 * len(self._xy)
+        self._sample_ids = np.resize(self._sample_ids, capacity)
+        self._xy = np.resize(self._xy, (capacity, 2))
+        self._values = np.resize(self._values, (capacity, len(_VALUE_COLUMNS)))
+
+    def add(self, sample_id, x, y, reading, metrics, readings=1):
+        """
+        Stores one site result (replacing any earlier one at the same key).
+
+        Args:
+            reading (acquisition.Reading): Averaged reading for the site.
+            metrics (dict): MeasurementLogic.calculate_metrics() result.
+            readings (int): How many readings were averaged.
+        """
+        key = (sample_id, round(float(x), 6), round(float(y), 6))
+        stats = self._stats.setdefault(sample_id, UniformityStats())
+        row = self._rows.get(key)
+        if row is None:
+            row = len(self._rows)
+            if row == len(self._xy):
+                self._grow()
+            self._rows[key] = row
+            if sample_id not in self._samples:
+                self._samples.append(sample_id)
+            self._sample_ids[row] = self._samples.index(sample_id)
+            self._xy[row] = key[1:]
+        else:
+            stats.remove(self._values[row, _VALUE_COLUMNS.index("sheet_resistance")])
+
+        rs = metrics["sheet_resistance"]
+        self._values[row] = (reading.timestamp, reading.v_inner, reading.v_outer,
+                             reading.i_outer, rs, metrics["resistivity"],
+                             metrics["conductivity"], readings)
+        stats.add(rs)
+        self.revision += 1
+
+    def samples(self):
+        return list(self._samples)
+
+    def _mask(self, sample_id):
+        n = len(self._rows)
+        if sample_id not in self._samples:
+            return np.zeros(n, dtype=bool)
+        return self._sample_ids[:n] == self._samples.index(sample_id)
+
+    def column(self, sample_id, name):
+        """
+        Values of one column for every measured site of a sample, in
+        measurement order ("x" and "y" are accepted too).
+        """
+        mask = self._mask(sample_id)
+        if name in ("x", "y"):
+            return self._xy[:len(mask)][mask, "xy".index(name)]
+        return self._values[:len(mask)][mask, _VALUE_COLUMNS.index(name)]
+
+    def stats(self, sample_id):
+        """
+        Sheet-resistance uniformity for one sample (see UniformityStats.summary).
+        """
+        stats = self._stats.get(sample_id)
+        if stats is None:
+            return UniformityStats().summary()
+        if stats._extremes_stale:
+            return stats.summary(self.column(sample_id, "sheet_resistance"))
+        return stats.summary()
+
+    def grid(self, sample_id, name="sheet_resistance", xs=None, ys=None):
+        """
+        2-D array for a heatmap.
+
+        Args:
+            xs, ys (array-like): Grid coordinates (e.g. from the planned
+                positions). Defaults to the distinct measured coordinates.
+
+        Returns:
+            tuple: (xs, ys, Z) with Z[row(y), col(x)]; unmeasured cells are NaN.
+        """
+        x = self.column(sample_id, "x")
+        y = self.column(sample_id, "y")
+        values = self.column(sample_id, name)
+        xs = np.unique(x) if xs is None else np.unique(np.round(np.asarray(xs, dtype=float), 6))
+        ys = np.unique(y) if ys is None else np.unique(np.round(np.asarray(ys, dtype=float), 6))
+        z = np.full((len(ys), len(xs)), np.nan)
+        if len(values) and len(xs) and len(ys):
+            col = np.clip(np.searchsorted(xs, x), 0, len(xs) - 1)
+            row = np.clip(np.searchsorted(ys, y), 0, len(ys) - 1)
+            on_grid = (xs[col] == x) & (ys[row] == y)
+            z[row[on_grid], col[on_grid]] = values[on_grid]
+        return xs, ys, z
+
+    def rows(self):
+        """
+        Every site as a list of dicts with SITE_COLUMNS keys.
+        """
+        out = []
+        for (sample_id, x, y), row in self._rows.items():
+            record = {"sample_id": sample_id, "x": x, "y": y}
+            record.update(zip(_VALUE_COLUMNS, self._values[row].tolist()))
+            out.append(record)
+        return out
+
+    def save_csv(self, path):
+        """
+        Writes every site to a CSV file (SITE_COLUMNS).
+        """
+        from recorder import StreamingRecorder
+        with StreamingRecorder(path, SITE_COLUMNS, resume=False) as rec:
+            for record in self.rows():
+                rec.append(record)
+        return path
+
+    def clear(self, sample_id=None):
+        """
+        Drops every site (or only those of one sample).
+        """
+        revision = self.revision
+        keep = [(k, self._values[r].copy()) for k, r in self._rows.items()
+                if sample_id is not None and k[0] != sample_id]
+        self.__init__(len(self._xy))
+        for (sid, x, y), values in keep:
+            reading = Reading(*values[:4])
+            metrics = dict(zip(_VALUE_COLUMNS[4:7], values[4:7]))
+            self.add(sid, x, y, reading, metrics, readings=int(values[7]))
+        self.revision = revision + 1
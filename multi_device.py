@@ -0,0 +1,235 @@
+import argparse
+import collections
+import heapq
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import port_discovery
+import smu_utils
+from acquisition import AcquisitionWorker, read_reading
+from smu_state import CachedDevice
+
+# Reading from one of several SMUs, tagged with the address it came from
+TaggedReading = collections.namedtuple(
+    "TaggedReading", ["device", "timestamp", "v_inner", "v_outer", "i_outer"]
+)
+
+
+def list_serial_ports():
+    """
+    Serial ports currently present (pyserial's comports()).
+    """
+    return list(port_discovery.list_serial_ports())
+
+
+class MultiDeviceOrchestrator:
+    """
+    Drives several SMUs concurrently and merges their readings into one stream.
+
+    Each device gets its own session and its own AcquisitionWorker thread, so
+    serial I/O on one port never waits for another and the aggregate reading
+    rate scales with the number of devices. drain() merges whatever every
+    worker has queued into a single time-ordered list of TaggedReading.
+
+    Usage:
+        with MultiDeviceOrchestrator(["/dev/ttyACM0", "/dev/ttyACM1"]) as orch:
+            orch.start()
+            for r in orch.drain(): ...
+    """
+
+    def __init__(self, addresses, connection_type='usb', samples=8192, v_limit=10.5,
+                 i_limit=0.22, drive_v=0.5, interval=0.0, sim_options=None):
+        """
+        Args:
+            addresses (list): Serial ports or IP addresses ("sim" for simulated).
+            connection_type (str): 'usb', 'ethernet' or 'sim' (applies to all addresses).
+            samples, v_limit, i_limit, drive_v: See smu_utils.configure_measurement.
+            interval (float): Minimum seconds between reads on each device.
+            sim_options (dict): Passed to simulated devices.
+        """
+        self.addresses = list(addresses)
+        self.connection_type = connection_type
+        self.config = {"samples": samples, "v_limit": v_limit,
+                       "i_limit": i_limit, "drive_v": drive_v}
+        self.interval = interval
+        self.sim_options = sim_options
+        self.devices = {}
+        self.workers = {}
+        self.errors = []
+        self.failed = {}
+        self.started_at = None
+
+    def open(self):
+        """
+        Connects to and configures all devices in parallel.
+
+        Returns:
+            list: Addresses that connected successfully (failures are in
+                  self.failed with the reason).
+        """
+        def connect(address):
+            device = smu_utils.get_session(address, self.connection_type,
+                                           sim_options=self.sim_options)
+            if not device:
+                raise ConnectionError(f"Failed to connect to {address}.")
+            device = CachedDevice(device)
+            smu_utils.configure_measurement(device, **self.config)
+            return device
+
+        if not self.addresses:
+            return []
+        with ThreadPoolExecutor(max_workers=len(self.addresses)) as pool:
+            futures = {address: pool.submit(connect, address) for address in self.addresses}
+        for address, future in futures.items():
+            try:
+                self.devices[address] = future.result()
+            except Exception as e:
+                self.failed[address] = str(e)
+        return list(self.devices)
+
+    def start(self):
+        """
+        Starts one acquisition thread per connected device.
+        """
+        self.started_at = time.monotonic()
+        for address, device in self.devices.items():
+            worker = AcquisitionWorker(lambda d=device: read_reading(d),
+                                       interval=self.interval)
+            worker.name = f"acq-{address}"
+            self.workers[address] = worker
+            worker.start()
+
+    def drain(self):
+        """
+        Returns every reading queued since the last call, merged across
+        devices in timestamp order. Read errors are appended to self.errors as
+        (address, exception).
+        """
+        streams = []
+        for address, worker in self.workers.items():
+            stream = []
+            for item in worker.drain():
+                if isinstance(item, Exception):
+                    self.errors.append((address, item))
+                else:
+                    stream.append(TaggedReading(address, *item))
+            streams.append(stream)
+        return list(heapq.merge(*streams, key=lambda r: r.timestamp))
+
+    def stats(self):
+        """
+        Per-device and aggregate reading counts and rates.
+        """
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        per_device = {}
+        for address, worker in self.workers.items():
+            per_device[address] = {
+                "readings": worker.count,
+                "dropped": worker.dropped,
+                "readings_per_s": worker.count / elapsed if elapsed > 0 else 0.0
+            }
+        total = sum(d["readings"] for d in per_device.values())
+        return {
+            "devices": per_device,
+            "failed": dict(self.failed),
+            "readings": total,
+            "readings_per_s": total / elapsed if elapsed > 0 else 0.0,
+            "elapsed_s": elapsed
+        }
+
+    def stop(self):
+        for worker in self.workers.values():
+            worker.stop(timeout=5.0)
+
+    def close(self):
+        """
+        Stops acquisition, switches outputs off and closes every session.
+        """
+        self.stop()
+        for address, device in self.devices.items():
+            try:
+                smu_utils.shutdown_output(device)
+                device.close()
+            except Exception as e:
+                print(f"Error closing {address}: {e}")
+        self.devices = {}
+        self.workers = {}
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def main(argv=None):
+    """
+    Usage:
+        python multi_device.py --duration 10 [--ports /dev/ttyACM0 /dev/ttyACM1]
+        python multi_device.py --ethernet 192.168.0.200 192.168.0.201
+        python multi_device.py --sim 4
+
+    Without --ports/--ethernet/--sim, every serial port found is used.
+    """
+    from recorder import StreamingRecorder
+
+    parser = argparse.ArgumentParser(description="Parallel acquisition across several SMUs")
+    parser.add_argument("--ports", nargs="+", help="Serial ports (default: all found)")
+    parser.add_argument("--ethernet", nargs="+", help="IP addresses (port 8888)")
+    parser.add_argument("--sim", type=int, default=0, help="Use N simulated devices")
+    parser.add_argument("--samples", type=int, default=8192)
+    parser.add_argument("--drive-v", type=float, default=0.5)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--output", help="CSV file for the merged stream")
+    args = parser.parse_args(argv)
+
+    if args.sim:
+        # Distinct names so each simulated device gets its own session
+        addresses = [f"{smu_utils.SIM_ADDRESS}{k}" for k in range(args.sim)]
+        conn = 'sim'
+    elif args.ethernet:
+        addresses, conn = args.ethernet, 'ethernet'
+    else:
+        addresses, conn = args.ports or list_serial_ports(), 'usb'
+    if not addresses:
+        print("No devices found.")
+        return 1
+
+    orch = MultiDeviceOrchestrator(addresses, conn, samples=args.samples, drive_v=args.drive_v)
+    rec = None
+    if args.output:
+        rec = StreamingRecorder(args.output, TaggedReading._fields, resume=False)
+    with orch:
+        if not orch.devices:
+            print(f"No device could be opened: {orch.failed}")
+            return 1
+        orch.start()
+        end = time.monotonic() + args.duration
+        while time.monotonic() < end:
+            time.sleep(0.2)
+            for reading in orch.drain():
+                if rec:
+                    rec.append(reading)
+        orch.stop()
+        for reading in orch.drain():
+            if rec:
+                rec.append(reading)
+        stats = orch.stats()
+    if rec:
+        rec.close()
+
+    for address, s in stats["devices"].items():
+        print(f"{address}: {s['readings']} readings ({s['readings_per_s']:.1f}/s)")
+    for address, reason in stats["failed"].items():
+        print(f"{address}: FAILED ({reason})")
+    print(f"Aggregate: {stats['readings']} readings, {stats['readings_per_s']:.1f} readings/s")
+    for address, e in orch.errors[:10]:
+        print(f"Read error on {address}: {e}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
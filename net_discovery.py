@@ -0,0 +1,258 @@
+import argparse
+import collections
+import ipaddress
+import json
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SMU_PORT = 8888            # CLOI over TCP (see smu_utils.get_session)
+CONNECT_TIMEOUT = 0.3      # Seconds; LAN hosts answer a TCP connect in a few ms
+PROBE_TIMEOUT = 2.0        # Seconds for the hello/version handshake
+SMU_HELLO = "Hello World"  # Reply of an Ossila SMU to `cloi hello`
+MAX_WORKERS = 64
+MAX_HOSTS = 4096           # Refuse to sweep anything larger than a /20 by accident
+
+# One responder. rtt_ms is the TCP connect time, hello_ms the cloi.hello()
+# round-trip (None if the handshake was not attempted or failed).
+DiscoveredDevice = collections.namedtuple(
+    "DiscoveredDevice",
+    ["address", "port", "rtt_ms", "hello_ms", "hello", "version", "smu", "error"]
+)
+
+
+def expand_targets(targets, max_hosts=MAX_HOSTS):
+    """
+    Turns a mix of targets into a de-duplicated list of host addresses.
+
+    Accepted forms:
+        "192.168.0.0/24"      every host in the subnet
+        "192.168.0.10-40"     a range in the last octet
+        "192.168.0.200"       a single address (hostnames are passed through)
+
+    Raises:
+        ValueError: If a target is malformed or the total exceeds `max_hosts`.
+    """
+    hosts = []
+    for target in targets:
+        target = target.strip()
+        if not target:
+            continue
+        if "/" in target:
+            network = ipaddress.ip_network(target, strict=False)
+            if network.num_addresses > max_hosts + 2:
+                raise ValueError(f"{target} has {network.num_addresses} addresses "
+                                 f"(limit {max_hosts})")
+            hosts.extend(str(h) for h in network.hosts())
+        elif "-" in target and target.count(".") == 3:
+            base, _, last = target.rpartition(".")
+            first, _, end = last.partition("-")
+            start = ipaddress.ip_address(f"{base}.{first}")
+            stop = ipaddress.ip_address(f"{base}.{end}")
+            if stop < start:
+                raise ValueError(f"Empty range: {target}")
+            hosts.extend(str(ipaddress.ip_address(int(start) + k))
+                         for k in range(int(stop) - int(start) + 1))
+        else:
+            hosts.append(target)
+        if len(hosts) > max_hosts:
+            raise ValueError(f"More than {max_hosts} hosts to scan")
+    return list(dict.fromkeys(hosts))
+
+
+def tcp_ping(address, port=SMU_PORT, timeout=CONNECT_TIMEOUT):
+    """
+    Times a TCP connect to address:port.
+
+    Returns:
+        float: Connect time in ms, or None if nothing is listening / it timed out.
+    """
+    start = time.perf_counter()
+    try:
+        with socket.create_connection((address, port), timeout=timeout):
+            return (time.perf_counter() - start) * 1e3
+    except OSError:
+        return None
+
+
+def _query(sock, command):
+    """
+    Sends one CLOI command line and returns the reply line.
+    """
+    sock.sendall(f"{command}\n".encode("ascii"))
+    reply = b""
+    while not reply.endswith(b"\n"):
+        chunk = sock.recv(256)
+        if not chunk:
+            break
+        reply += chunk
+    return reply.decode("ascii", errors="replace").strip()
+
+
+def is_smu_hello(reply):
+    """
+    True if a `cloi hello` reply identifies an Ossila SMU.
+    """
+    return bool(reply) and reply.strip().lower() == SMU_HELLO.lower()
+
+
+def fingerprint(address, port=SMU_PORT, timeout=PROBE_TIMEOUT):
+    """
+    Runs the `cloi hello` / `cloi version` handshake over a plain socket.
+
+    Every send and receive is bounded by `timeout`, so a host that accepts
+    the connection but never answers cannot hold the probe (or the
+    interpreter at exit) beyond it.
+
+    Returns:
+        dict: {"hello": reply, "hello_ms": round-trip, "version": str or None}
+    """
+    with socket.create_connection((address, port), timeout=timeout) as sock:
+        sock.settimeout(timeout)
+        start = time.perf_counter()
+        hello = _query(sock, "cloi hello")
+        hello_ms = (time.perf_counter() - start) * 1e3
+        version = None
+        if is_smu_hello(hello):
+            try:
+                version = _query(sock, "cloi version") or None
+            except OSError:
+                pass
+    return {"hello": hello, "hello_ms": hello_ms, "version": version}
+
+
+def rank(devices):
+    """
+    SMUs first, then fastest handshake, then fastest connect.
+    """
+    def key(d):
+        return (not d.smu, d.hello_ms if d.hello_ms is not None else float("inf"),
+                d.rtt_ms if d.rtt_ms is not None else float("inf"))
+    return sorted(devices, key=key)
+
+
+def discover(targets, port=SMU_PORT, connect_timeout=CONNECT_TIMEOUT,
+             probe_timeout=PROBE_TIMEOUT, workers=MAX_WORKERS, probe=True,
+             fingerprint_fn=fingerprint):
+    """
+    Scans addresses for networked SMUs.
+
+    Stage 1 TCP-connects to every host, `workers` at a time, with a short
+    timeout, so a silent /24 costs ceil(254 / workers) connect timeouts
+    (four with the default 64 workers) rather than 254 of them. Stage 2
+    fingerprints only the hosts with the port open, all at once, through the
+    cloi hello / version handshake. Only a reply matching SMU_HELLO counts
+    as an SMU; other services on the port are listed with smu=False.
+
+    Args:
+        targets (list): Subnets, ranges or addresses (see expand_targets).
+        probe (bool): Run the handshake (False = report open ports only).
+        fingerprint_fn (callable): fingerprint_fn(address, port, timeout) -> dict.
+
+    Returns:
+        list: Ranked DiscoveredDevice entries for every host with the port open.
+    """
+    hosts = expand_targets(targets)
+    if not hosts:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(hosts))) as pool:
+        rtts = list(pool.map(lambda h: tcp_ping(h, port, connect_timeout), hosts))
+    open_hosts = [(h, rtt) for h, rtt in zip(hosts, rtts) if rtt is not None]
+    if not open_hosts:
+        return []
+    if not probe:
+        return rank([DiscoveredDevice(h, port, rtt, None, None, None, False, None)
+                     for h, rtt in open_hosts])
+
+    # One daemon thread per open host: the handshake has its own socket
+    # timeout, and a thread that still hangs cannot keep the process alive
+    results = {}
+
+    def probe(host):
+        try:
+            results[host] = fingerprint_fn(host, port, probe_timeout)
+        except Exception as e:
+            results[host] = e
+
+    threads = [threading.Thread(target=probe, args=(h,), daemon=True, name=f"net-probe-{h}")
+               for h, _ in open_hosts]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + probe_timeout
+    for thread in threads:
+        thread.join(max(deadline - time.monotonic(), 0.0))
+
+    found = []
+    for host, rtt in open_hosts:
+        info = results.get(host)
+        if info is None:
+            found.append(DiscoveredDevice(host, port, rtt, None, None, None, False,
+                                          "handshake timed out"))
+        elif isinstance(info, Exception):
+            error = "handshake timed out" if isinstance(info, socket.timeout) else \
+                str(info) or type(info).__name__
+            found.append(DiscoveredDevice(host, port, rtt, None, None, None, False, error))
+        else:
+            smu = is_smu_hello(info.get("hello"))
+            found.append(DiscoveredDevice(
+                host, port, rtt, info.get("hello_ms"), info.get("hello"),
+                info.get("version"), smu,
+                None if smu else f"not an SMU (hello: {info.get('hello')!r})"
+            ))
+    return rank(found)
+
+
+def format_inventory(devices):
+    """
+    Human-readable table of discover() results.
+    """
+    lines = [f"{'Address':<18} {'SMU':<4} {'Connect':>9} {'Hello':>9}  Version / Error"]
+    for d in devices:
+        connect = f"{d.rtt_ms:.1f} ms" if d.rtt_ms is not None else "-"
+        hello = f"{d.hello_ms:.1f} ms" if d.hello_ms is not None else "-"
+        lines.append(f"{d.address:<18} {'yes' if d.smu else 'no':<4} {connect:>9} {hello:>9}  "
+                     f"{d.version or d.error or ''}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """
+    Usage:
+        python net_discovery.py 192.168.0.0/24
+        python net_discovery.py 10.0.1.10-40 10.0.2.5 --json
+    """
+    parser = argparse.ArgumentParser(description="Find networked SMUs (CLOI on TCP 8888)")
+    parser.add_argument("targets", nargs="+", help="Subnets (a.b.c.0/24), ranges (a.b.c.10-40) "
+                                                   "or addresses")
+    parser.add_argument("--port", type=int, default=SMU_PORT)
+    parser.add_argument("--timeout", type=float, default=CONNECT_TIMEOUT,
+                        help="TCP connect timeout per host (s)")
+    parser.add_argument("--probe-timeout", type=float, default=PROBE_TIMEOUT,
+                        help="Handshake timeout for all open hosts (s)")
+    parser.add_argument("--no-probe", action="store_true", help="Only report open ports")
+    parser.add_argument("--json", action="store_true", help="Print the inventory as JSON")
+    args = parser.parse_args(argv)
+
+    start = time.monotonic()
+    try:
+        devices = discover(args.targets, args.port, args.timeout, args.probe_timeout,
+                           probe=not args.no_probe)
+    except ValueError as e:
+        print(f"Invalid target: {e}")
+        return 2
+    elapsed = time.monotonic() - start
+    if args.json:
+        print(json.dumps([d._asdict() for d in devices], indent=2))
+    elif devices:
+        print(format_inventory(devices))
+        print(f"\n{sum(d.smu for d in devices)} SMU(s), {len(devices)} open host(s) "
+              f"in {elapsed:.1f} s")
+    else:
+        print(f"No hosts with port {args.port} open ({elapsed:.1f} s).")
+    return 0 if any(d.smu for d in devices) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
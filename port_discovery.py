@@ -0,0 +1,254 @@
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import smu_utils
+from net_discovery import is_smu_hello
+
+# Event kinds emitted by PortDiscovery
+ADDED = "added"
+REMOVED = "removed"
+IDENTIFIED = "identified"   # Probe finished; see PortDiscovery.info(port)["smu"]
+
+PortEvent = collections.namedtuple("PortEvent", ["kind", "port", "info"])
+
+
+def list_serial_ports():
+    """
+    Returns {device: description} for every serial port present.
+    """
+    import serial.tools.list_ports  # pyserial is only loaded when ports are listed
+    return {p.device: p.description for p in serial.tools.list_ports.comports()}
+
+
+def probe_port(port):
+    """
+    Opens `port`, asks cloi.hello() and closes it again.
+
+    Returns:
+        dict: {"smu": bool, "hello": reply}; "smu" is only True for the
+              Ossila hello reply (same rule as net_discovery).
+
+    Raises:
+        Exception: Whatever opening or talking to the port raised.
+    """
+    device = smu_utils.load_xtralien().Device(port)
+    try:
+        reply = device.cloi.hello()
+    finally:
+        device.close()
+    reply = str(reply).strip() if reply is not None else ""
+    return {"smu": is_smu_hello(reply), "hello": reply}
+
+
+class PortDiscovery:
+    """
+    Cached, non-blocking serial port enumeration with hot-plug events.
+
+    ports() returns the last enumeration immediately and, once it is older
+    than `ttl`, refreshes it on a background thread, so UI code can call it on
+    every repaint or Streamlit rerun. start() additionally polls on its own so
+    add/remove events arrive without anyone asking.
+
+    Every newly seen port is probed with cloi.hello() on a small thread pool
+    (all candidates at once, not one after the other) to tell the SMU apart
+    from other serial devices; best_port() then auto-selects it. Ports for
+    which `is_busy(port)` is true (already open by us) are not probed.
+
+    Events are queued and handed out by drain_events(), so a Qt timer or a
+    Streamlit rerun can consume them on its own thread; `on_event` callbacks
+    are also called, from the discovery threads.
+    """
+
+    def __init__(self, ttl=2.0, probe=True, probe_fn=probe_port, lister=list_serial_ports,
+                 probe_timeout=3.0, is_busy=None, on_event=None, max_events=256):
+        """
+        Args:
+            ttl (float): Seconds an enumeration stays fresh.
+            probe (bool): Probe new ports with `probe_fn`.
+            probe_fn (callable): probe_fn(port) -> info dict with "smu" key.
+            lister (callable): Returns {port: description}.
+            probe_timeout (float): Seconds before a probe is reported as failed.
+                (A hung open keeps its pool thread until it returns.)
+            is_busy (callable): is_busy(port) -> True to skip probing it.
+            on_event (callable): on_event(PortEvent), called from worker threads.
+            max_events (int): Capacity of the event queue (oldest dropped).
+        """
+        self.ttl = ttl
+        self.probe = probe
+        self.probe_fn = probe_fn
+        self.lister = lister
+        self.probe_timeout = probe_timeout
+        self.is_busy = is_busy
+        self.on_event = on_event
+        self.refreshes = 0
+
+        self._ports = {}
+        self._info = {}
+        self._scanned_at = None
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._events = collections.deque(maxlen=max_events)
+        self._probe_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="port-probe")
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # --- queries (never block on I/O once the first scan is done) ---
+    def ports(self, max_age=None):
+        """
+        Known ports, in enumeration order. The first call scans synchronously;
+        later calls return the cache and trigger a background refresh when it
+        is older than `max_age` (default: ttl).
+        """
+        if self._scanned_at is None:
+            self.refresh()
+        elif time.monotonic() - self._scanned_at > (self.ttl if max_age is None else max_age):
+            self.refresh(wait=False)
+        with self._lock:
+            return list(self._ports)
+
+    def description(self, port):
+        with self._lock:
+            return self._ports.get(port, "")
+
+    def info(self, port):
+        """
+        Probe result for a port: {"smu": bool, ...}, {"smu": None} while the
+        probe is pending, or None if the port was never probed.
+        """
+        with self._lock:
+            info = self._info.get(port)
+            return dict(info) if info is not None else None
+
+    def smu_ports(self):
+        """
+        Ports that answered cloi.hello().
+        """
+        with self._lock:
+            return [p for p in self._ports if (self._info.get(p) or {}).get("smu")]
+
+    def best_port(self, preferred=None):
+        """
+        Port to auto-select: `preferred` if it is still present and was not
+        shown to be something else, otherwise the first identified SMU,
+        otherwise the first port (None if there are none).
+        """
+        ports = self.ports()
+        if preferred in ports and (self.info(preferred) or {}).get("smu") is not False:
+            return preferred
+        smus = self.smu_ports()
+        if smus:
+            return smus[0]
+        return ports[0] if ports else None
+
+    def drain_events(self):
+        """
+        Returns (and removes) queued PortEvents, oldest first.
+        """
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+        return events
+
+    # --- scanning ---
+    def refresh(self, wait=True):
+        """
+        Re-enumerates ports, emits added/removed events and starts probes for
+        new ports. With wait=False the scan runs on a background thread and a
+        scan already in progress is not duplicated.
+        """
+        if not wait:
+            if self._refreshing.locked():
+                return
+            threading.Thread(target=self.refresh, daemon=True, name="port-scan").start()
+            return
+        with self._refreshing:
+            try:
+                current = dict(self.lister())
+            except Exception as e:
+                print(f"Port scan failed: {e}")
+                current = None
+            with self._lock:
+                self._scanned_at = time.monotonic()
+                self.refreshes += 1
+                if current is None:
+                    return
+                added = [p for p in current if p not in self._ports]
+                removed = [p for p in self._ports if p not in current]
+                self._ports = current
+                for port in removed:
+                    self._info.pop(port, None)
+            for port in removed:
+                self._emit(REMOVED, port, None)
+            for port in added:
+                self._emit(ADDED, port, {"description": current[port]})
+            if self.probe:
+                for port in added:
+                    self._start_probe(port)
+
+    def reprobe(self, port):
+        """
+        Forgets the probe result for `port` and probes it again.
+        """
+        with self._lock:
+            self._info.pop(port, None)
+        self._start_probe(port)
+
+    def _start_probe(self, port):
+        if self.is_busy and self.is_busy(port):
+            return
+        with self._lock:
+            if port in self._info:
+                return
+            self._info[port] = {"smu": None}
+        future = self._probe_pool.submit(self.probe_fn, port)
+        threading.Thread(target=self._finish_probe, args=(port, future),
+                         daemon=True, name=f"probe-{port}").start()
+
+    def _finish_probe(self, port, future):
+        started = time.monotonic()
+        try:
+            info = dict(future.result(timeout=self.probe_timeout))
+        except Exception as e:
+            info = {"smu": False, "error": str(e) or type(e).__name__}
+        info["probe_s"] = time.monotonic() - started
+        with self._lock:
+            if port not in self._ports:
+                return  # Unplugged while probing
+            self._info[port] = info
+        self._emit(IDENTIFIED, port, dict(info))
+
+    def _emit(self, kind, port, info):
+        event = PortEvent(kind, port, info)
+        with self._lock:
+            self._events.append(event)
+        if self.on_event:
+            try:
+                self.on_event(event)
+            except Exception as e:
+                print(f"Port event handler failed: {e}")
+
+    # --- background polling ---
+    def start(self, interval=None):
+        """
+        Polls for hot-plug changes every `interval` seconds (default: ttl).
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        interval = self.ttl if interval is None else interval
+        self._stop_event.clear()
+
+        def run():
+            while not self._stop_event.is_set():
+                self.refresh()
+                self._stop_event.wait(interval)
+
+        self._thread = threading.Thread(target=run, daemon=True, name="port-discovery")
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread and threading.current_thread() is not self._thread:
+            self._thread.join(timeout=2.0)
+        self._probe_pool.shutdown(wait=False)
@@ -0,0 +1,157 @@
+import csv
+import os
+import time
+
+import instrumentation
+
+
+def repair(path):
+    """
+    Truncates a partially written last line (e.g. after a crash or power cut)
+    so the file ends on a complete row.
+
+    Returns:
+        int: Number of bytes removed.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return 0
+        # Walk back to the last newline
+        pos = size
+        block = 4096
+        while pos > 0:
+            step = min(block, pos)
+            f.seek(pos - step)
+            chunk = f.read(step)
+            idx = chunk.rfind(b"\n")
+            if idx != -1:
+                keep = pos - step + idx + 1
+                break
+            pos -= step
+        else:
+            keep = 0
+        if keep < size:
+            f.truncate(keep)
+            f.flush()
+            os.fsync(f.fileno())
+        return size - keep
+
+
+def count_rows(path):
+    """
+    Number of data rows (excluding the header) in a CSV written by the recorder.
+    """
+    with open(path, "rb") as f:
+        lines = sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 16), b""))
+    return max(lines - 1, 0)
+
+
+class StreamingRecorder:
+    """
+    Append-only CSV recorder with bounded memory.
+
+    Rows are buffered in chunks of `chunk_size` and appended to disk; the file
+    is fsync'd at most every `fsync_interval` seconds (and on close). A crash
+    therefore loses at most one chunk, and memory use does not grow with the
+    length of the run.
+
+    Opening an existing file resumes it: a truncated last line is repaired,
+    the header must match `columns`, and new rows are appended after the
+    existing ones.
+
+    Usage:
+        with StreamingRecorder("results/run.csv", ["Current (A)", "Voltage (V)"]) as rec:
+            rec.append({"Current (A)": i, "Voltage (V)": v})
+    """
+
+    def __init__(self, path, columns, chunk_size=64, fsync_interval=1.0, resume=True):
+        """
+        Args:
+            path (str): CSV file to write. Parent directories are created.
+            columns (list): Column names (header row).
+            chunk_size (int): Rows buffered before each write.
+            fsync_interval (float): Minimum seconds between fsync calls.
+            resume (bool): Append to an existing file instead of overwriting it.
+        """
+        self.path = path
+        self.columns = list(columns)
+        self.chunk_size = max(int(chunk_size), 1)
+        self.fsync_interval = fsync_interval
+        self.rows_written = 0
+        self._pending = []
+        self._last_sync = time.monotonic()
+
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+
+        existing = resume and os.path.exists(path) and os.path.getsize(path) > 0
+        if existing:
+            repair(path)
+            with open(path, newline="") as f:
+                header = next(csv.reader(f), None)
+            if header is None:
+                existing = False
+            elif header != self.columns:
+                raise ValueError(f"Cannot resume {path}: columns {header} != {self.columns}")
+            else:
+                self.rows_written = count_rows(path)
+
+        self._file = open(path, "a" if existing else "w", newline="")
+        self._writer = csv.writer(self._file)
+        if not existing:
+            self._writer.writerow(self.columns)
+            self._sync()
+
+    @property
+    def count(self):
+        """
+        Rows appended so far (written + still buffered).
+        """
+        return self.rows_written + len(self._pending)
+
+    def append(self, row):
+        """
+        Queues one row (dict keyed by column, or a sequence in column order).
+        """
+        if isinstance(row, dict):
+            row = [row.get(c, "") for c in self.columns]
+        self._pending.append(row)
+        if len(self._pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self, fsync=False):
+        """
+        Writes buffered rows. fsyncs if forced or the interval has elapsed.
+        """
+        with instrumentation.timer("smu_file_write_seconds", writer="csv"):
+            if self._pending:
+                self._writer.writerows(self._pending)
+                self.rows_written += len(self._pending)
+                instrumentation.count("smu_rows_written_total", len(self._pending), writer="csv")
+                self._pending = []
+            self._file.flush()
+            if fsync or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush(fsync=True)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_sync = time.monotonic()
@@ -0,0 +1,261 @@
+import random
+import threading
+import time
+
+import instrumentation
+import smu_utils
+from acquisition import read_reading
+from smu_parse import MalformedResponseError
+from smu_state import CachedDevice
+
+# Error classes (see classify)
+TRANSPORT = "transport"   # Port/link trouble: reconnect, then retry
+GLITCH = "glitch"         # Garbled reply on a live link: retry as is
+FATAL = "fatal"           # Programming/configuration error: never retried
+
+# Order settings are replayed in after a reconnect: limits and filters before
+# the output is enabled, and the source voltage last.
+_RESTORE_ORDER = ("limitv", "limiti", "filter", "enabled", "voltage")
+
+
+def classify(exc):
+    """
+    Sorts an exception raised while talking to the SMU.
+
+    pyserial's SerialException and socket errors are OSError subclasses, so
+    OSError (plus EOFError, ConnectionError, TimeoutError) is treated as a
+    transport failure. A MalformedResponseError means the link delivered a
+    bad reply, which is usually a one-off. Everything else is fatal.
+    """
+    if isinstance(exc, MalformedResponseError):
+        return GLITCH
+    if isinstance(exc, (OSError, EOFError, ConnectionError, TimeoutError)):
+        return TRANSPORT
+    # pyserial is optional; match its exception by name to avoid importing it
+    if type(exc).__name__ in ("SerialException", "SerialTimeoutException", "PortNotOpenError"):
+        return TRANSPORT
+    return FATAL
+
+
+class RetryPolicy:
+    """
+    Bounded exponential backoff: base_delay * multiplier**n, capped at
+    max_delay, with +/- `jitter` relative randomisation so several clients
+    do not retry in lock-step.
+    """
+
+    def __init__(self, retries=3, base_delay=0.05, max_delay=2.0, multiplier=2.0, jitter=0.1):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+    def delay(self, attempt):
+        """
+        Seconds to wait before retry number `attempt` (0-based).
+        """
+        delay = min(self.base_delay * self.multiplier ** attempt, self.max_delay)
+        if self.jitter:
+            delay *= 1.0 + random.uniform(-self.jitter, self.jitter)
+        return max(delay, 0.0)
+
+
+DEFAULT_POLICY = RetryPolicy()
+
+
+def retry_call(fn, policy=DEFAULT_POLICY, on_retry=None, sleep=time.sleep):
+    """
+    Calls fn() and retries transport errors and glitches with backoff.
+
+    Args:
+        fn (callable): The operation; must be safe to repeat.
+        on_retry (callable): on_retry(exc, kind, attempt) before each retry,
+            e.g. to reconnect. An exception it raises counts as another
+            failed attempt.
+
+    Raises:
+        The last exception once retries are exhausted, or a fatal one at once.
+        If on_retry keeps failing, its last error is raised (chained to the
+        error that triggered the retry).
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            kind = classify(e)
+            if kind == FATAL or attempt >= policy.retries:
+                raise
+            error = e
+        # Back off and recover before calling fn again. A failed recovery
+        # uses up an attempt and is itself retried; fn is never repeated on
+        # a session that did not come back.
+        while True:
+            sleep(policy.delay(attempt))
+            attempt += 1
+            if on_retry is None:
+                break
+            try:
+                on_retry(error, kind, attempt)
+                break
+            except Exception as retry_error:
+                kind = classify(retry_error)
+                if kind == FATAL or attempt >= policy.retries:
+                    raise retry_error from error
+
+
+class ResilientSession:
+    """
+    An SMU session that survives USB/Ethernet hiccups.
+
+    Operations go through call(fn), which runs fn(device) and retries it per
+    the RetryPolicy. After a transport error the port is closed and reopened,
+    and every setting the previous CachedDevice had applied (limits, filters,
+    enables, source voltage) is replayed before the retry, so a long run
+    continues as if nothing happened. Only pass operations that are safe to
+    repeat (reads, configuration); use call(fn, idempotent=False) for anything
+    else, which reconnects but re-raises instead of repeating.
+
+    Attribute access falls through to the current CachedDevice, so the
+    session can be used wherever a device is expected; those direct calls
+    are not retried.
+    """
+
+    def __init__(self, address, connection_type='usb', policy=DEFAULT_POLICY,
+                 sim_options=None, connect_fn=None):
+        """
+        Args:
+            connect_fn (callable): connect_fn() -> raw device, raising on
+                failure. Defaults to smu_utils.get_session(..., raise_errors=True).
+        """
+        self.address = address
+        self.connection_type = connection_type
+        self.policy = policy
+        self.sim_options = sim_options
+        self.connect_fn = connect_fn or (lambda: smu_utils.get_session(
+            address, connection_type, sim_options=sim_options, raise_errors=True))
+        self.device = None
+        self.retries = 0
+        self.reconnects = 0
+        self.failures = 0
+        self.last_error = None
+        self._restore = {}   # Settings still to replay if a reopen failed
+        self._lock = threading.RLock()
+
+    def __getattr__(self, name):
+        # Only reached for attributes not defined on the session
+        device = self.__dict__.get("device")
+        if device is None:
+            raise AttributeError(f"{name} (session to {self.address} is not connected)")
+        return getattr(device, name)
+
+    def connect(self):
+        """
+        Opens the session (no retries; raises ConnectionError on failure).
+        """
+        with self._lock:
+            if self.device is None:
+                self.device = CachedDevice(self.connect_fn())
+            return self
+
+    def reconnect(self):
+        """
+        Closes and reopens the port, then restores the applied settings.
+
+        The settings are kept until they have been replayed on a new session,
+        so a reopen (or replay) that fails can simply be tried again.
+
+        Raises:
+            ConnectionError: If the port cannot be reopened; the session is
+                then disconnected and the next call() reconnects first.
+        """
+        with self._lock:
+            if self.device is not None:
+                # Values applied since the last replay take precedence
+                self._restore.update(self.device.applied())
+            self._drop()
+            self.device = CachedDevice(self.connect_fn())
+            self.reconnects += 1
+            instrumentation.count("smu_reconnects_total")
+            self.restore(self._restore)
+            self._restore = {}
+
+    def restore(self, applied):
+        """
+        Re-sends {(channel, setting): value} in a safe order.
+        """
+        order = {name: k for k, name in enumerate(_RESTORE_ORDER)}
+        for (channel, setting), value in sorted(
+                applied.items(), key=lambda item: (order.get(item[0][1], -1), item[0][0])):
+            getattr(getattr(self.device, channel).set, setting)(value, response=0)
+
+    def call(self, fn, idempotent=True):
+        """
+        Runs fn(device) with retries (see class docstring).
+        """
+        with self._lock:
+            def on_retry(exc, kind, attempt):
+                self.retries += 1
+                self.last_error = exc
+                instrumentation.count("smu_retries_total", kind=kind)
+                if kind == TRANSPORT:
+                    self.reconnect()
+
+            try:
+                # A session left disconnected by a failed reopen comes back
+                # (with its settings replayed) before fn ever sees it
+                retry_call(self._ensure_connected, self.policy, on_retry)
+                if idempotent:
+                    return retry_call(lambda: fn(self.device), self.policy, on_retry)
+                try:
+                    return fn(self.device)
+                except Exception as e:
+                    if classify(e) == TRANSPORT:
+                        self.last_error = e
+                        retry_call(self.reconnect, self.policy)
+                    raise
+            except Exception as e:
+                self.failures += 1
+                self.last_error = e
+                raise
+
+    def read(self):
+        """
+        One four-point reading (acquisition.Reading), with retries.
+        """
+        return self.call(read_reading)
+
+    def stats(self):
+        return {
+            "retries": self.retries,
+            "reconnects": self.reconnects,
+            "failures": self.failures,
+            "last_error": str(self.last_error) if self.last_error else None
+        }
+
+    def _ensure_connected(self):
+        if self.device is None:
+            if self._restore:
+                self.reconnect()
+            else:
+                self.connect()
+
+    def _drop(self):
+        if self.device is not None:
+            try:
+                self.device.close()
+            except Exception:
+                pass
+            self.device = None
+
+    def close(self):
+        with self._lock:
+            self._drop()
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,223 @@
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Preallocated, fixed-capacity history of numeric readings.
+
+    Rows live in a (capacity, n_columns) float64 array; appending overwrites the
+    oldest row once the buffer is full, so appends are O(1) and memory is
+    bounded regardless of how long a session runs. Readers get chronological
+    (oldest first) views via column()/tail().
+    """
+
+    def __init__(self, capacity, columns):
+        """
+        Args:
+            capacity (int): Maximum number of rows kept.
+            columns (list): Column names.
+        """
+        self.capacity = max(int(capacity), 1)
+        self.columns = list(columns)
+        self._index = {name: k for k, name in enumerate(self.columns)}
+        self._data = np.zeros((self.capacity, len(self.columns)))
+        self._next = 0
+        self.size = 0
+        # Total rows ever appended; lets callers detect new data cheaply
+        self.total = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, row):
+        """
+        Adds one row (dict keyed by column name, or a sequence in column order).
+        """
+        if isinstance(row, dict):
+            row = [row.get(c, np.nan) for c in self.columns]
+        self._data[self._next] = row
+        self._next = (self._next + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.total += 1
+
+    def clear(self):
+        self._next = 0
+        self.size = 0
+        self.total = 0
+
+    def _order(self, n=None):
+        """
+        Physical row indices of the last n rows, oldest first.
+        """
+        n = self.size if n is None else min(max(int(n), 0), self.size)
+        start = (self._next - n) % self.capacity
+        return (start + np.arange(n)) % self.capacity
+
+    def column(self, name, n=None):
+        """
+        Last n values (default: all) of one column, oldest first.
+        """
+        return self._data[self._order(n), self._index[name]]
+
+    def tail(self, n=None):
+        """
+        Last n rows as {column: array}, oldest first.
+        """
+        rows = self._data[self._order(n)]
+        return {name: rows[:, k] for k, name in enumerate(self.columns)}
+
+    def latest(self):
+        """
+        Most recent row as a dict, or None if empty.
+        """
+        if not self.size:
+            return None
+        row = self._data[(self._next - 1) % self.capacity]
+        return {name: float(row[k]) for k, name in enumerate(self.columns)}
+
+    def resized(self, capacity):
+        """
+        Returns a new buffer with the given capacity holding the most recent rows.
+        """
+        new = RingBuffer(capacity, self.columns)
+        rows = self._data[self._order(min(self.size, new.capacity))]
+        new._data[:len(rows)] = rows
+        new.size = len(rows)
+        new._next = len(rows) % new.capacity
+        new.total = self.total
+        return new
+
+
+def decimate_minmax(x, y, max_points):
+    """
+    Reduces a trace to at most ~max_points while keeping its envelope.
+
+    The data is split into max_points // 2 bins and each bin contributes its
+    minimum and maximum (in time order), so spikes survive decimation and the
+    cost of drawing no longer grows with history length.
+
+    Returns:
+        tuple: (x, y) arrays.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n = len(y)
+    bins = max(int(max_points) // 2, 1)
+    if n <= max_points or n < 2 * bins:
+        return x, y
+
+    per_bin = n // bins
+    usable = per_bin * bins
+    yb = y[:usable].reshape(bins, per_bin)
+    # NaN rows (gaps) would break argmin/argmax
+    filled = np.where(np.isnan(yb), np.nanmean(y) if np.isfinite(y).any() else 0.0, yb)
+    i_min = filled.argmin(axis=1)
+    i_max = filled.argmax(axis=1)
+    first = np.minimum(i_min, i_max)
+    second = np.maximum(i_min, i_max)
+    offsets = np.arange(bins) * per_bin
+    idx = np.empty(2 * bins, dtype=int)
+    idx[0::2] = offsets + first
+    idx[1::2] = offsets + second
+    # Keep the unbinned remainder as-is so the newest points are exact
+    idx = np.concatenate([idx, np.arange(usable, n)])
+    return x[idx], y[idx]
+
+
+class MinMaxEnvelope:
+    """
+    Min/max envelope of one or more traces, maintained as readings arrive.
+
+    Readings are folded into blocks holding each column's minimum and maximum
+    (with their times). When all `max_points // 2` blocks are used, adjacent
+    blocks are merged pairwise and the block size doubles. Appending is O(1)
+    amortised and trace() costs O(max_points), so drawing a whole run stays
+    flat however many readings it has. Until the first merge the trace is
+    exact.
+    """
+
+    def __init__(self, columns, max_points=2000):
+        """
+        Args:
+            columns (list): Names of the traced columns (time is separate).
+            max_points (int): Upper bound on points returned by trace().
+        """
+        self.columns = list(columns)
+        self._index = {name: k for k, name in enumerate(self.columns)}
+        self.bins = max(int(max_points) // 2 // 2 * 2, 2)   # Even, for pairwise merges
+        # Per block and column: (t_min, y_min, t_max, y_max); +/-inf marks "no data"
+        self._blocks = np.empty((self.bins, len(self.columns), 4))
+        self.clear()
+
+    def __len__(self):
+        return self.total
+
+    def clear(self):
+        self._n = 0          # Completed blocks
+        self.block = 1       # Readings per completed block
+        self.total = 0
+        self._start_partial()
+
+    def _start_partial(self):
+        n = len(self.columns)
+        self._count = 0
+        self._partial = np.empty((n, 4))
+        self._partial[:, 1] = np.inf
+        self._partial[:, 3] = -np.inf
+
+    def append(self, t, values):
+        """
+        Adds one reading: time `t` and one value per column (NaN is skipped).
+        """
+        values = np.asarray(values, dtype=float)
+        p = self._partial
+        lower = values < p[:, 1]
+        p[lower, 0] = t
+        p[lower, 1] = values[lower]
+        higher = values > p[:, 3]
+        p[higher, 2] = t
+        p[higher, 3] = values[higher]
+        self._count += 1
+        self.total += 1
+        if self._count == self.block:
+            if self._n == self.bins:
+                self._merge()
+            self._blocks[self._n] = p
+            self._n += 1
+            self._start_partial()
+
+    def _merge(self):
+        a = self._blocks[0:self._n:2]
+        b = self._blocks[1:self._n:2]
+        merged = a.copy()
+        use_b = b[..., 1] < a[..., 1]
+        merged[use_b, 0:2] = b[use_b, 0:2]
+        use_b = b[..., 3] > a[..., 3]
+        merged[use_b, 2:4] = b[use_b, 2:4]
+        self._n //= 2
+        self._blocks[:self._n] = merged
+        self.block *= 2
+
+    def trace(self, name):
+        """
+        Envelope of one column in time order.
+
+        Returns:
+            tuple: (t, y) arrays with at most ~max_points points.
+        """
+        k = self._index[name]
+        rows = self._blocks[:self._n, k]
+        if self._count:
+            rows = np.vstack([rows, self._partial[k]])
+        t_min, y_min, t_max, y_max = rows.T
+        min_first = t_min <= t_max
+        t = np.empty(2 * len(rows))
+        y = np.empty(2 * len(rows))
+        t[0::2] = np.where(min_first, t_min, t_max)
+        y[0::2] = np.where(min_first, y_min, y_max)
+        t[1::2] = np.where(min_first, t_max, t_min)
+        y[1::2] = np.where(min_first, y_max, y_min)
+        keep = np.isfinite(y)
+        # A block with one reading (or a flat one) has min == max: draw it once
+        keep[1::2] &= t[1::2] != t[0::2]
+        return t[keep], y[keep]
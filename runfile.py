@@ -0,0 +1,231 @@
+import csv
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import instrumentation
+
+FORMAT_NAME = "smurun"
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+DTYPE = np.dtype("<f8")
+
+# Default columns for four-point-probe runs (timestamps are Unix seconds)
+RUN_COLUMNS = ["timestamp", "v_inner", "v_outer", "i_outer",
+               "sheet_resistance", "resistivity", "conductivity"]
+
+
+def _column_file(path, index):
+    return os.path.join(path, f"col_{index:03d}.f8")
+
+
+def _write_meta(path, meta):
+    # Write-then-rename so a crash never leaves a half-written header
+    tmp = os.path.join(path, META_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(path, META_FILE))
+
+
+def read_meta(path):
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    if meta.get("format") != FORMAT_NAME:
+        raise ValueError(f"{path} is not a {FORMAT_NAME} directory.")
+    return meta
+
+
+def _complete_rows(path, n_columns):
+    """
+    Rows present in every column file (columns can differ by a partial chunk
+    after a crash; the shortest one wins).
+    """
+    sizes = []
+    for k in range(n_columns):
+        f = _column_file(path, k)
+        sizes.append(os.path.getsize(f) // DTYPE.itemsize if os.path.exists(f) else 0)
+    return min(sizes) if sizes else 0
+
+
+class RunWriter:
+    """
+    Columnar binary run writer.
+
+    A run is a directory (conventionally `*.smurun`) holding a `meta.json`
+    header (column names, dtype, row count, geometry/config used) and one raw
+    little-endian float64 file per column. Appending is a plain byte append per
+    column, and each column can be memory-mapped for reading without parsing.
+
+    Has the same append/flush/close interface as recorder.StreamingRecorder,
+    so the two can be used interchangeably. Rows may be dicts (extra keys are
+    ignored) or sequences in column order; all values must be numeric.
+    """
+
+    def __init__(self, path, columns=RUN_COLUMNS, config=None, chunk_size=256,
+                 fsync_interval=1.0, resume=True):
+        """
+        Args:
+            path (str): Run directory to create (or resume).
+            columns (list): Column names.
+            config (dict): JSON-serialisable geometry/config stored in the header.
+            chunk_size (int): Rows buffered before each append.
+            fsync_interval (float): Minimum seconds between fsync calls.
+            resume (bool): Append to an existing run with the same columns.
+        """
+        self.path = path
+        self.columns = list(columns)
+        self.chunk_size = max(int(chunk_size), 1)
+        self.fsync_interval = fsync_interval
+        self._buffer = np.empty((self.chunk_size, len(self.columns)), dtype=DTYPE)
+        self._n_pending = 0
+        self._last_sync = time.monotonic()
+
+        existing = resume and os.path.exists(os.path.join(path, META_FILE))
+        if existing:
+            self.meta = read_meta(path)
+            if self.meta["columns"] != self.columns:
+                raise ValueError(f"Cannot resume {path}: columns {self.meta['columns']} "
+                                 f"!= {self.columns}")
+            if config:
+                self.meta["config"] = config
+            # Drop any partial chunk so all columns line up again
+            self.rows_written = _complete_rows(path, len(self.columns))
+            for k in range(len(self.columns)):
+                with open(_column_file(path, k), "ab") as f:
+                    f.truncate(self.rows_written * DTYPE.itemsize)
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.rows_written = 0
+            self.meta = {
+                "format": FORMAT_NAME,
+                "version": FORMAT_VERSION,
+                "dtype": DTYPE.str,
+                "columns": self.columns,
+                "rows": 0,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "config": config or {}
+            }
+            for k in range(len(self.columns)):
+                open(_column_file(path, k), "wb").close()
+
+        self._files = [open(_column_file(path, k), "ab") for k in range(len(self.columns))]
+        self.meta["rows"] = self.rows_written
+        _write_meta(path, self.meta)
+
+    @property
+    def count(self):
+        return self.rows_written + self._n_pending
+
+    def append(self, row):
+        if isinstance(row, dict):
+            row = [row.get(c, np.nan) for c in self.columns]
+        self._buffer[self._n_pending] = row
+        self._n_pending += 1
+        if self._n_pending >= self.chunk_size:
+            self.flush()
+
+    def flush(self, fsync=False):
+        with instrumentation.timer("smu_file_write_seconds", writer="run"):
+            if self._n_pending:
+                block = self._buffer[:self._n_pending]
+                for k, f in enumerate(self._files):
+                    f.write(np.ascontiguousarray(block[:, k]).tobytes())
+                self.rows_written += self._n_pending
+                instrumentation.count("smu_rows_written_total", self._n_pending, writer="run")
+                self._n_pending = 0
+            for f in self._files:
+                f.flush()
+            if fsync or time.monotonic() - self._last_sync >= self.fsync_interval:
+                for f in self._files:
+                    os.fsync(f.fileno())
+                self.meta["rows"] = self.rows_written
+                _write_meta(self.path, self.meta)
+                self._last_sync = time.monotonic()
+
+    def close(self):
+        if not self._files:
+            return
+        self.flush(fsync=True)
+        for f in self._files:
+            f.close()
+        self._files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def read_run(path, mmap=True):
+    """
+    Opens a run for reading.
+
+    Args:
+        path (str): Run directory.
+        mmap (bool): Memory-map the column files (read-only) instead of
+                     loading them.
+
+    Returns:
+        tuple: ({column name: 1-D float64 array}, meta dict)
+    """
+    meta = read_meta(path)
+    columns = meta["columns"]
+    rows = _complete_rows(path, len(columns))
+    data = {}
+    for k, name in enumerate(columns):
+        if rows == 0:
+            data[name] = np.empty(0, dtype=DTYPE)
+        elif mmap:
+            data[name] = np.memmap(_column_file(path, k), dtype=DTYPE, mode="r", shape=(rows,))
+        else:
+            data[name] = np.fromfile(_column_file(path, k), dtype=DTYPE, count=rows)
+    return data, meta
+
+
+def export_csv(path, csv_path, chunk_rows=65536):
+    """
+    Writes a run out as CSV (header = column names), chunk by chunk.
+
+    Returns:
+        int: Number of rows written.
+    """
+    data, meta = read_run(path)
+    columns = meta["columns"]
+    rows = len(data[columns[0]]) if columns else 0
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for start in range(0, rows, chunk_rows):
+            block = np.column_stack([data[c][start:start + chunk_rows] for c in columns])
+            writer.writerows(block.tolist())
+    return rows
+
+
+def main(argv=None):
+    """
+    Usage:
+        python runfile.py info <run.smurun>
+        python runfile.py export <run.smurun> <out.csv>
+    """
+    args = sys.argv[1:] if argv is None else argv
+    if len(args) >= 2 and args[0] == "info":
+        data, meta = read_run(args[1])
+        print(json.dumps({**meta, "rows": len(next(iter(data.values()), []))}, indent=2))
+    elif len(args) >= 3 and args[0] == "export":
+        rows = export_csv(args[1], args[2])
+        print(f"Exported {rows} rows to {args[2]}")
+    else:
+        print(main.__doc__)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
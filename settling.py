@@ -0,0 +1,129 @@
+import time
+
+from acquisition import read_reading
+from smu_parse import parse_smu
+
+POLL_FILTER = 64          # Fast, low-filter readings while waiting
+DEFAULT_TOLERANCE = 5e-3  # Relative spread allowed across the window (0.5 %)
+DEFAULT_WINDOW = 3        # Consecutive readings that must agree
+DEFAULT_TIMEOUT = 2.0     # Seconds before giving up and measuring anyway
+
+
+def wait_until_stable(read_value, tolerance=DEFAULT_TOLERANCE, floor=0.0,
+                      window=DEFAULT_WINDOW, timeout=DEFAULT_TIMEOUT, hint=0.0):
+    """
+    Polls `read_value()` until the last `window` values agree.
+
+    "Agree" means max - min <= tolerance * |mean| + floor. `floor` is an
+    absolute allowance for quantities that settle towards zero.
+
+    Args:
+        read_value (callable): Returns one float per call (one reading).
+        tolerance (float): Allowed relative spread across the window.
+        floor (float): Allowed absolute spread, in the units of the value.
+        window (int): Number of consecutive values compared (at least 2).
+        timeout (float): Maximum seconds to wait, including `hint`.
+        hint (float): Seconds to wait before polling starts, e.g. a fraction of
+            the settle time reported for the same sample on an earlier run.
+
+    Returns:
+        dict: {"settled": bool, "settle_time": seconds from the call until
+               the window agreed (or the timeout), "readings": values read,
+               "value": last value}
+    """
+    window = max(int(window), 2)
+    start = time.monotonic()
+    if hint > 0:
+        time.sleep(min(hint, timeout))
+    values = []
+    settled = False
+    while True:
+        values.append(read_value())
+        recent = values[-window:]
+        if len(recent) == window:
+            mean = sum(recent) / window
+            if max(recent) - min(recent) <= tolerance * abs(mean) + floor:
+                settled = True
+                break
+        if time.monotonic() - start >= timeout:
+            break
+    return {
+        "settled": settled,
+        "settle_time": time.monotonic() - start,
+        "readings": len(values),
+        "value": values[-1]
+    }
+
+
+def _current_filter(device, channel):
+    """
+    Filter depth a channel is at: the value a CachedDevice recorded, else
+    asked from the device with `<channel>.get.filter()`. None if unknown.
+    """
+    if hasattr(device, "applied"):
+        depth = device.applied().get((channel, "filter"))
+        if depth is not None:
+            return depth
+    try:
+        return int(float(str(getattr(device, channel).get.filter()).strip()))
+    except Exception as e:
+        print(f"Could not read the {channel} filter depth ({e}); it stays at the poll depth.")
+        return None
+
+
+def _with_poll_filter(device, poll_filter, fn):
+    """
+    Runs fn() with smu1/vsense1 at `poll_filter`, then puts the previous
+    filter depths back (in a finally, for cached and raw devices alike).
+    """
+    previous = {ch: _current_filter(device, ch) for ch in ("smu1", "vsense1")}
+    try:
+        device.smu1.set.filter(poll_filter, response=0)
+        device.vsense1.set.filter(poll_filter, response=0)
+        return fn()
+    finally:
+        for channel, depth in previous.items():
+            if depth is not None and depth != poll_filter:
+                getattr(device, channel).set.filter(depth, response=0)
+
+
+def settle(device, tolerance=DEFAULT_TOLERANCE, timeout=DEFAULT_TIMEOUT, hint=0.0,
+           window=DEFAULT_WINDOW, poll_filter=POLL_FILTER):
+    """
+    Waits for the four-point ratio V_inner / I_outer to stop drifting after
+    the source voltage (or the sample) changed. Replaces a fixed sleep.
+
+    With no current flowing the ratio is taken as 0, so an open circuit
+    "settles" at once instead of burning the whole timeout.
+
+    Returns:
+        dict: See wait_until_stable.
+    """
+    def ratio():
+        r = read_reading(device)
+        return r.v_inner / r.i_outer if r.i_outer else 0.0
+
+    return _with_poll_filter(device, poll_filter, lambda: wait_until_stable(
+        ratio, tolerance=tolerance, window=window, timeout=timeout, hint=hint
+    ))
+
+
+def settle_current(device, floor=1e-9, tolerance=DEFAULT_TOLERANCE, timeout=DEFAULT_TIMEOUT,
+                   hint=0.0, window=DEFAULT_WINDOW, poll_filter=POLL_FILTER):
+    """
+    Waits for the smu1 current alone to stop changing, e.g. for the output
+    to discharge after a reset. Works with vsense1 disabled.
+
+    Args:
+        floor (float): Absolute current spread accepted (A), so a current
+            decaying to zero counts as settled.
+
+    Returns:
+        dict: See wait_until_stable.
+    """
+    def current():
+        return parse_smu(device.smu1.measure())[1]
+
+    return _with_poll_filter(device, poll_filter, lambda: wait_until_stable(
+        current, tolerance=tolerance, floor=floor, window=window, timeout=timeout, hint=hint
+    ))
@@ -0,0 +1,137 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import smu_utils
+from acquisition import read_reading
+from smu_state import CachedDevice
+
+DEFAULT_TIMEOUT = 10.0
+
+
+class AsyncSession:
+    """
+    Coroutine API around one SMU session.
+
+    The xtralien transport is blocking, so every call runs on a dedicated
+    single-thread executor owned by the session. That keeps commands to one
+    port strictly ordered while letting the event loop overlap I/O across
+    several sessions (e.g. asyncio.gather over many devices).
+
+    Every coroutine accepts a `timeout` (seconds, None = session default).
+    On timeout or cancellation the awaiting task is released immediately, but
+    the blocking call already sent to the port still runs to completion in the
+    background and later commands queue behind it. The setting cache is
+    cleared in that case since the device state is no longer known.
+    """
+
+    def __init__(self, device, address, timeout=DEFAULT_TIMEOUT, executor=None):
+        self.device = device
+        self.address = address
+        self.timeout = timeout
+        # The session owns its executor and shuts it down on close()
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"smu-{address}"
+        )
+
+    async def _run(self, fn, *args, timeout=None, **kwargs):
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(future, self.timeout if timeout is None else timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            if isinstance(self.device, CachedDevice):
+                self.device.invalidate()
+            raise
+
+    async def configure(self, samples=8192, v_limit=10.5, i_limit=0.22, drive_v=0.5,
+                        timeout=None):
+        """
+        See smu_utils.configure_measurement.
+        """
+        await self._run(smu_utils.configure_measurement, self.device, samples=samples,
+                        v_limit=v_limit, i_limit=i_limit, drive_v=drive_v, timeout=timeout)
+
+    async def set(self, channel, setting, value, timeout=None):
+        """
+        Sends `<channel>.set.<setting>(value, response=0)`.
+        """
+        setter = getattr(getattr(self.device, channel).set, setting)
+        await self._run(setter, value, response=0, timeout=timeout)
+
+    async def measure(self, timeout=None):
+        """
+        One four-point reading (acquisition.Reading).
+        """
+        return await self._run(read_reading, self.device, timeout=timeout)
+
+    async def measure_channel(self, channel="smu1", timeout=None):
+        """
+        Raw `<channel>.measure()` response.
+        """
+        return await self._run(getattr(self.device, channel).measure, timeout=timeout)
+
+    async def sweep(self, start, inc, end, delay_us=1000, timeout=None):
+        """
+        Raw on-device `smu1.sweep` [V, I] matrix.
+        """
+        return await self._run(self.device.smu1.sweep, start, inc, end, delay_us,
+                               timeout=timeout)
+
+    async def shutdown_output(self, timeout=None):
+        await self._run(smu_utils.shutdown_output, self.device, timeout=timeout)
+
+    async def close(self, timeout=None):
+        try:
+            await self._run(self.device.close, timeout=timeout)
+        finally:
+            self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+        return False
+
+
+def _close_orphaned(future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    device = future.result()
+    if device:
+        try:
+            device.close()
+        except Exception as e:
+            print(f"Error closing abandoned session: {e}")
+
+
+async def get_session(address=None, connection_type='usb', timeout=DEFAULT_TIMEOUT,
+                      sim_options=None):
+    """
+    Coroutine version of smu_utils.get_session.
+
+    Returns:
+        AsyncSession: Wrapping a CachedDevice, so repeated configure() calls
+                      only send settings that changed.
+
+    Raises:
+        ConnectionError: If the device could not be opened.
+        asyncio.TimeoutError: If connecting took longer than `timeout`.
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"smu-{address}")
+    connect = executor.submit(functools.partial(
+        smu_utils.get_session, address, connection_type, sim_options=sim_options
+    ))
+    try:
+        device = await asyncio.wait_for(asyncio.wrap_future(connect), timeout)
+    except BaseException:
+        # The connect thread cannot be interrupted; if it still opens the
+        # port after we gave up, close it so the port is not left held.
+        connect.add_done_callback(_close_orphaned)
+        executor.shutdown(wait=False)
+        raise
+    if not device:
+        executor.shutdown(wait=False)
+        raise ConnectionError(f"Failed to connect to {address}.")
+    return AsyncSession(CachedDevice(device), address, timeout=timeout, executor=executor)
@@ -0,0 +1,139 @@
+import re
+
+import numpy as np
+
+import instrumentation
+
+# Structured layout for a block of readings (see reading_array / decode_into)
+READING_DTYPE = np.dtype([
+    ("timestamp", "f8"),
+    ("v_inner", "f8"),
+    ("v_outer", "f8"),
+    ("i_outer", "f8"),
+])
+
+# Separators seen in text replies: "0.5,0.005", "[0.5 0.005]", "0.5;0.005\n"
+_TEXT_SPLIT = re.compile(r"[\s,;\[\]]+")
+
+
+class MalformedResponseError(ValueError):
+    """
+    Raised when a device reply cannot be decoded into the expected numbers.
+
+    Attributes:
+        channel (str): Channel that produced the reply ("smu1", "vsense1", ...).
+        response: The raw reply, kept for logging.
+    """
+
+    def __init__(self, channel, response, reason):
+        self.channel = channel
+        self.response = response
+        super().__init__(f"Malformed {channel} response ({reason}): {response!r}")
+
+
+def parse_values(response, count, channel="smu1"):
+    """
+    Decodes the first `count` numbers of a measure reply.
+
+    xtralien normally returns a float ndarray ([[V, I]] for smu, [V] for
+    vsense); those are read with ndarray.item(), without building any
+    intermediate arrays or strings. String/bytes arrays, nested lists and raw
+    text replies are also accepted through slower fallbacks.
+
+    Returns:
+        tuple: `count` Python floats.
+
+    Raises:
+        MalformedResponseError: If the reply is missing, too short or not numeric.
+    """
+    if response is None:
+        raise MalformedResponseError(channel, response, "no reply")
+    try:
+        if isinstance(response, np.ndarray):
+            if response.size < count:
+                raise MalformedResponseError(channel, response, f"expected {count} values")
+            if count == 1:
+                return (float(response.item(0)),)
+            if count == 2:
+                return float(response.item(0)), float(response.item(1))
+            return tuple(float(response.item(k)) for k in range(count))
+        if isinstance(response, (bytes, bytearray)):
+            response = response.decode("ascii", "replace")
+        if isinstance(response, str):
+            values = [v for v in _TEXT_SPLIT.split(response) if v]
+        else:
+            values = np.asarray(response, dtype=object).reshape(-1)
+        if len(values) < count:
+            raise MalformedResponseError(channel, response, f"expected {count} values")
+        return tuple(float(values[k]) for k in range(count))
+    except MalformedResponseError:
+        raise
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise MalformedResponseError(channel, response, str(e)) from None
+
+
+def parse_smu(response, channel="smu1"):
+    """
+    Returns:
+        tuple: (voltage, current) from an smu measure/oneshot reply.
+    """
+    return parse_values(response, 2, channel)
+
+
+def parse_vsense(response, channel="vsense1"):
+    """
+    Returns:
+        float: Voltage from a vsense measure reply.
+    """
+    return parse_values(response, 1, channel)[0]
+
+
+@instrumentation.timed("smu_parse_seconds")
+def parse_pair(v_data, smu_data):
+    """
+    Decodes the vsense1 + smu1 replies of one four-point reading.
+
+    Returns:
+        tuple: (v_inner, v_outer, i_outer) floats.
+    """
+    v_outer, i_outer = parse_smu(smu_data)
+    return parse_vsense(v_data), v_outer, i_outer
+
+
+def parse_matrix(response, columns=2, channel="smu1"):
+    """
+    Decodes a multi-point reply (e.g. `smu1 sweep`) into an N x `columns`
+    float array. Float ndarrays are returned as a view when possible.
+
+    Raises:
+        MalformedResponseError: If the reply is missing or does not split
+            into whole rows of numbers.
+    """
+    if response is None:
+        raise MalformedResponseError(channel, response, "no reply")
+    try:
+        arr = np.asarray(response, dtype=float)
+    except (TypeError, ValueError) as e:
+        raise MalformedResponseError(channel, response, str(e)) from None
+    if arr.size % columns:
+        raise MalformedResponseError(channel, response, f"not a multiple of {columns} values")
+    return arr.reshape(-1, columns)
+
+
+def reading_array(n):
+    """
+    Preallocates a structured array of `n` readings (READING_DTYPE).
+    """
+    return np.zeros(n, dtype=READING_DTYPE)
+
+
+def decode_into(out, index, v_data, smu_data, timestamp=0.0):
+    """
+    Decodes one vsense1 + smu1 reply pair straight into row `index` of a
+    structured array from reading_array(), with no per-reading allocation.
+
+    Raises:
+        MalformedResponseError: The row is left untouched.
+    """
+    v_inner, v_outer, i_outer = parse_pair(v_data, smu_data)
+    out[index] = (timestamp, v_inner, v_outer, i_outer)
@@ -0,0 +1,170 @@
+import atexit
+import contextlib
+import threading
+import time
+
+import instrumentation
+import smu_utils
+from resilient import DEFAULT_POLICY, retry_call
+from smu_state import CachedDevice
+
+
+class _PooledSession:
+    def __init__(self, address, connection_type):
+        self.address = address
+        self.connection_type = connection_type
+        self.device = None
+        self.lock = threading.RLock()
+        self.last_used = 0.0
+        self.connects = 0
+        self.retries = 0
+
+
+class ConnectionManager:
+    """
+    Process-wide pool of open SMU sessions, one per address.
+
+    Streamlit re-runs the script for every interaction, so opening the port,
+    saying hello and closing it again on every "MEASURE" press dominates the
+    measurement time. The manager keeps each session open across reruns and
+    hands it out under a per-address lock so concurrent browser sessions take
+    turns on the serial port.
+
+    Sessions are (re)connected lazily: the first use opens the port, a session
+    idle for longer than `health_check_interval` is pinged with cloi.hello()
+    before use, and any exception raised while a session is checked out drops
+    it so the next use reconnects.
+    """
+
+    def __init__(self, health_check_interval=30.0, sim_options=None):
+        self.health_check_interval = health_check_interval
+        self.sim_options = sim_options
+        self._sessions = {}
+        self._lock = threading.Lock()
+        atexit.register(self.close_all)
+
+    @contextlib.contextmanager
+    def session(self, address, connection_type='usb'):
+        """
+        Context manager yielding an open device for `address`.
+
+        Raises:
+            ConnectionError: If the device cannot be opened.
+        """
+        entry = self._entry(address, connection_type)
+        with entry.lock:
+            self._ensure_connected(entry)
+            try:
+                yield entry.device
+            except BaseException:
+                # State of the port is unknown; reconnect on next use
+                self._disconnect(entry)
+                raise
+            finally:
+                entry.last_used = time.monotonic()
+
+    def call(self, address, fn, connection_type='usb', policy=DEFAULT_POLICY):
+        """
+        Runs fn(device) on the pooled session, retrying with backoff.
+
+        A transport error or garbled reply drops the session (see session()),
+        so each retry starts on a freshly opened port. `fn` must be safe to
+        repeat from the start: configure, measure, clean up.
+
+        Returns:
+            Whatever fn returns.
+        """
+        entry = self._entry(address, connection_type)
+
+        def attempt():
+            with self.session(address, connection_type) as device:
+                return fn(device)
+
+        def note_retry(exc, kind, attempt_no):
+            entry.retries += 1
+            instrumentation.count("smu_retries_total", kind=kind)
+            print(f"{address}: {kind} error ({exc}), retry {attempt_no}/{policy.retries}...")
+
+        return retry_call(attempt, policy, note_retry)
+
+    def invalidate(self, address):
+        """
+        Closes the session for `address` (next use reconnects).
+        """
+        entry = self._sessions.get(address)
+        if entry:
+            with entry.lock:
+                self._disconnect(entry)
+
+    def close_all(self):
+        with self._lock:
+            entries = list(self._sessions.values())
+        for entry in entries:
+            with entry.lock:
+                self._disconnect(entry)
+
+    def is_open(self, address):
+        """
+        True if a session to `address` is currently connected.
+        """
+        with self._lock:
+            entry = self._sessions.get(address)
+            return entry is not None and entry.device is not None
+
+    def stats(self):
+        """
+        Returns per-address connection info for display/debugging.
+        """
+        with self._lock:
+            return {
+                address: {
+                    "connected": entry.device is not None,
+                    "connects": entry.connects,
+                    "retries": entry.retries,
+                    "idle_s": time.monotonic() - entry.last_used if entry.last_used else None
+                }
+                for address, entry in self._sessions.items()
+            }
+
+    # --- internals ---
+    def _entry(self, address, connection_type):
+        with self._lock:
+            entry = self._sessions.get(address)
+            if entry is None:
+                entry = _PooledSession(address, connection_type)
+                self._sessions[address] = entry
+        if entry.connection_type != connection_type:
+            # Wait for whoever is using the old port; taken outside the pool
+            # lock so a session holder can still call is_open()/stats()
+            with entry.lock:
+                if entry.connection_type != connection_type:
+                    self._disconnect(entry)
+                    entry.connection_type = connection_type
+        return entry
+
+    def _ensure_connected(self, entry):
+        if entry.device is not None:
+            idle = time.monotonic() - entry.last_used
+            if idle < self.health_check_interval:
+                return
+            try:
+                entry.device.cloi.hello()
+                return
+            except Exception as e:
+                print(f"Health check failed on {entry.address} ({e}), reconnecting...")
+                self._disconnect(entry)
+
+        device = smu_utils.get_session(entry.address, entry.connection_type,
+                                       sim_options=self.sim_options, raise_errors=True)
+        # Fresh setting cache per connection, so unchanged limits/filters
+        # are not re-sent on every press
+        entry.device = CachedDevice(device)
+        entry.connects += 1
+
+    def _disconnect(self, entry):
+        if entry.device is not None:
+            try:
+                entry.device.close()
+            except Exception:
+                pass
+            entry.device = None
@@ -0,0 +1,229 @@
+import threading
+import time
+
+import numpy as np
+
+# pi / ln(2): ratio between sheet resistance and inner V/I on an infinite sheet
+_K = np.pi / np.log(2)
+
+
+class SimulatedDevice:
+    """
+    Drop-in stand-in for xtralien.Device for offline development and benchmarking.
+
+    Implements the subset of the CLOI API used in this repo:
+        device.cloi.hello() / device.cloi.version()
+        device.smu1.set.{enabled, voltage, limitv, limiti, filter}(value, response=0)
+        device.smu1.get.error()
+        device.smu1.measure() / oneshot(v) / sweep(start, inc, end, delay)
+        device.vsense1.set.{enabled, filter}(value, response=0)
+        device.vsense1.measure()
+        device.measure_pair()   (simulator extension, see acquisition.read_reading)
+        device.close()
+
+    Timing model: every command costs `latency` seconds (serial round-trip) and
+    every measured point additionally costs `filter * sample_time` seconds of
+    integration. All commands are serialized through one lock, like a real port.
+
+    Electrical model: the outer probes see `resistance` Ohms (I = V / R) and the
+    inner probes see the infinite-sheet drop V_in = I * sheet_resistance * ln2 / pi.
+    When |I| exceeds the current limit the source goes into compliance: the
+    current is clamped and get.error() returns True.
+    """
+
+    def __init__(self, address="sim", resistance=100.0, sheet_resistance=50.0,
+                 latency=0.002, sample_time=20e-6, noise=1e-3, seed=None,
+                 time_scale=1.0):
+        """
+        Args:
+            address (str): Reported address, only used for display.
+            resistance (float): Two-terminal resistance between outer probes (Ohm).
+            sheet_resistance (float): Simulated sample sheet resistance (Ohm/sq).
+            latency (float): Per-command serial round-trip time in seconds.
+            sample_time (float): Integration time per filter sample in seconds.
+            noise (float): Relative noise (1 sigma) at filter = 64. Scales with
+                sqrt(64 / filter) so deeper filters give quieter readings.
+            seed (int): Seed for reproducible noise.
+            time_scale (float): Multiplier applied to all simulated delays
+                (0 disables sleeping entirely).
+        """
+        self.address = address
+        self.resistance = resistance
+        self.sheet_resistance = sheet_resistance
+        self.latency = latency
+        self.sample_time = sample_time
+        self.noise = noise
+        self.time_scale = time_scale
+        self.serial = "SIM-0001"
+        self.command_count = 0
+        self.is_open = True
+
+        self._rng = np.random.default_rng(seed)
+        self._io_lock = threading.Lock()
+
+        self.cloi = _SimCloi(self)
+        self.smu1 = _SimSMU(self, "smu1")
+        self.vsense1 = _SimVsense(self, "vsense1")
+
+    def close(self):
+        self.is_open = False
+
+    def measure_pair(self, pipelined=True):
+        """
+        Reads smu1 and vsense1 over the same integration window.
+
+        Models a transport that pipelines both measure commands: one
+        round-trip, and the two channels integrate concurrently, so the cost is
+        the deeper of the two filters rather than their sum.
+        Set `pipelined=False` to get the sequential two-command timing.
+
+        Returns:
+            tuple: (v_inner, v_outer, i_outer) floats.
+        """
+        smu, vsense = self.smu1, self.vsense1
+        if pipelined:
+            self._command(points=1, filter_depth=max(smu.filter, vsense.filter))
+        else:
+            self._command(points=1, filter_depth=vsense.filter)
+            self._command(points=1, filter_depth=smu.filter)
+        v, i, v_inner, compliance = self._solve(smu.voltage)
+        smu.error = compliance
+        if not vsense.enabled:
+            v_inner = 0.0
+        return (float(self._noisy(v_inner, vsense.filter)),
+                float(self._noisy(v, smu.filter)),
+                float(self._noisy(i, smu.filter)))
+
+    # --- internals shared by the channels ---
+    def _command(self, points=0, filter_depth=0, extra=0.0):
+        """
+        Accounts for one command round-trip plus `points` integrations.
+        """
+        if not self.is_open:
+            raise IOError(f"Simulated device {self.address} is closed.")
+        with self._io_lock:
+            self.command_count += 1
+            delay = self.latency + points * filter_depth * self.sample_time + extra
+            if self.time_scale and delay > 0:
+                time.sleep(delay * self.time_scale)
+
+    def _noisy(self, value, filter_depth):
+        if not self.noise or value == 0:
+            return value
+        sigma = self.noise * np.sqrt(64.0 / max(filter_depth, 1))
+        return value * (1.0 + sigma * self._rng.standard_normal())
+
+    def _solve(self, v_set):
+        """
+        Returns (v_outer, i_outer, v_inner, in_compliance) for a source voltage.
+        """
+        smu = self.smu1
+        if not smu.enabled:
+            return 0.0, 0.0, 0.0, False
+        v = max(-smu.limitv, min(smu.limitv, v_set))
+        i = v / self.resistance if self.resistance else 0.0
+        compliance = abs(i) > smu.limiti
+        if compliance:
+            i = np.copysign(smu.limiti, i)
+            v = i * self.resistance
+        v_inner = i * self.sheet_resistance / _K
+        return v, i, v_inner, compliance
+
+
+class _SimSetter:
+    def __init__(self, channel, names):
+        self._channel = channel
+        self._names = names
+
+    def __getattr__(self, name):
+        if name not in self._names:
+            raise AttributeError(f"{self._channel.name} has no setting '{name}'")
+        def setter(value, response=1):
+            self._channel._device._command()
+            setattr(self._channel, name, type(getattr(self._channel, name))(value))
+            return None if response == 0 else value
+        return setter
+
+
+class _SimGetter:
+    def __init__(self, channel):
+        self._channel = channel
+
+    def __getattr__(self, name):
+        def getter():
+            self._channel._device._command()
+            return getattr(self._channel, name)
+        return getter
+
+
+class _SimCloi:
+    def __init__(self, device):
+        self._device = device
+
+    def hello(self):
+        self._device._command()
+        return "Hello World\n"
+
+    def version(self):
+        self._device._command()
+        return "sim-1.0"
+
+
+class _SimSMU:
+    def __init__(self, device, name):
+        self._device = device
+        self.name = name
+        self.enabled = False
+        self.voltage = 0.0
+        self.limitv = 10.0
+        self.limiti = 0.225
+        self.filter = 1
+        self.error = False
+        self.set = _SimSetter(self, ("enabled", "voltage", "limitv", "limiti", "filter"))
+        self.get = _SimGetter(self)
+
+    def _point(self, v_set):
+        v, i, _, compliance = self._device._solve(v_set)
+        self.error = compliance
+        return [self._device._noisy(v, self.filter), self._device._noisy(i, self.filter)]
+
+    def measure(self):
+        self._device._command(points=1, filter_depth=self.filter)
+        return np.array([self._point(self.voltage)])
+
+    def oneshot(self, voltage):
+        self.voltage = float(voltage)
+        return self.measure()
+
+    def sweep(self, start, inc, end, delay):
+        """
+        Device-side sweep: one round-trip, returns an N x 2 [V, I] matrix.
+        `delay` is the per-point settle time in microseconds.
+        """
+        if inc == 0:
+            raise ValueError("Sweep increment must be non-zero.")
+        n = int(np.floor((end - start) / inc + 1e-9)) + 1
+        points = start + inc * np.arange(max(n, 0))
+        self._device._command(points=len(points), filter_depth=self.filter,
+                              extra=len(points) * delay * 1e-6)
+        rows = [self._point(v) for v in points]
+        if len(points):
+            self.voltage = float(points[-1])
+        return np.array(rows).reshape(-1, 2)
+
+
+class _SimVsense:
+    def __init__(self, device, name):
+        self._device = device
+        self.name = name
+        self.enabled = False
+        self.filter = 1
+        self.set = _SimSetter(self, ("enabled", "filter"))
+        self.get = _SimGetter(self)
+
+    def measure(self):
+        self._device._command(points=1, filter_depth=self.filter)
+        if not self.enabled:
+            return np.array([0.0])
+        _, _, v_inner, _ = self._device._solve(self._device.smu1.voltage)
+        return np.array([self._device._noisy(v_inner, self.filter)])
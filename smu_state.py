@@ -0,0 +1,135 @@
+import instrumentation
+
+_MISSING = object()
+
+# Channels whose `set.*` commands are tracked
+CHANNELS = ("smu1", "smu2", "vsense1", "vsense2")
+
+# Leaf channel commands that are timed and invalidate the cache on failure
+_COMMANDS = ("measure", "oneshot", "sweep")
+
+
+class CachedDevice:
+    """
+    Wraps an xtralien.Device (or smu_sim.SimulatedDevice) and remembers the
+    last value applied with each `<channel>.set.<setting>(value, response=0)`.
+
+    Re-sending a setting with the value it already has is skipped, so code can
+    keep calling the full configuration sequence before every measurement and
+    only pay for the commands that actually change something. Everything else
+    (measure, sweep, cloi, close, ...) is passed straight through.
+
+    The cache assumes nobody else talks to the device. It is cleared whenever a
+    command raises (the device state is then unknown) and should be thrown
+    away on reconnect; wrap the new device in a new CachedDevice.
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self.sent = 0
+        self.skipped = 0
+        self._applied = {}
+        self._channels = {}
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the wrapper itself
+        if name in CHANNELS:
+            channel = self._channels.get(name)
+            if channel is None:
+                channel = _CachedChannel(self, name, getattr(self.device, name))
+                self._channels[name] = channel
+            return channel
+        return getattr(self.device, name)
+
+    def invalidate(self, channel=None):
+        """
+        Forgets applied values (for one channel, or all of them).
+        """
+        if channel is None:
+            self._applied.clear()
+        else:
+            for key in [k for k in self._applied if k[0] == channel]:
+                del self._applied[key]
+
+    def applied(self):
+        """
+        Returns {(channel, setting): value} for everything known to be applied.
+        """
+        return dict(self._applied)
+
+    def stats(self):
+        return {"sent": self.sent, "skipped": self.skipped}
+
+    def close(self):
+        self.invalidate()
+        self.device.close()
+
+
+class _CachedChannel:
+    def __init__(self, owner, name, channel):
+        self._owner = owner
+        self._name = name
+        self._channel = channel
+        self.set = _CachedSetter(owner, name, channel.set)
+
+    def __getattr__(self, name):
+        attr = getattr(self._channel, name)
+        if name not in _COMMANDS:
+            # Namespaces such as `get` (get.error(), ...) and anything else
+            # pass through untouched; xtralien command objects are callable
+            # too, so wrapping them would hide their sub-commands.
+            return attr
+
+        def call(*args, **kwargs):
+            try:
+                with instrumentation.timer("smu_command_seconds", channel=self._name, command=name):
+                    result = attr(*args, **kwargs)
+            except Exception:
+                self._owner.invalidate()
+                raise
+            if name in ("oneshot", "sweep"):
+                # These move the source voltage themselves
+                self._owner._applied.pop((self._name, "voltage"), None)
+            return result
+        return call
+
+
+class _CachedSetter:
+    def __init__(self, owner, channel_name, setter):
+        self._owner = owner
+        self._channel_name = channel_name
+        self._setter = setter
+        self._methods = {}
+
+    def __getattr__(self, name):
+        method = self._methods.get(name)
+        if method is None:
+            method = self._make(name)
+            self._methods[name] = method
+        return method
+
+    def _make(self, name):
+        owner = self._owner
+        key = (self._channel_name, name)
+        real = getattr(self._setter, name)
+
+        def setter(value, *args, **kwargs):
+            # Only fire-and-forget writes are skipped; a caller asking for a
+            # response always reaches the device.
+            if not args and kwargs.get("response", 1) == 0:
+                if owner._applied.get(key, _MISSING) == value:
+                    owner.skipped += 1
+                    instrumentation.count("smu_set_total", channel=key[0], setting=name,
+                                          result="skipped")
+                    return None
+            try:
+                with instrumentation.timer("smu_set_seconds", channel=key[0], setting=name):
+                    result = real(value, *args, **kwargs)
+            except Exception:
+                owner.invalidate()
+                raise
+            instrumentation.count("smu_set_total", channel=key[0], setting=name, result="sent")
+            owner.sent += 1
+            owner._applied[key] = value
+            return result
+        return setter
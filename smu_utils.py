@@ -1,35 +1,73 @@
-import xtralien
 import time
 import sys
 
-def get_session(address=None, connection_type='usb'):
+import instrumentation
+
+# xtralien is imported on the first real connection (see load_xtralien), so
+# tools that only use the simulator or parse files never pay for it.
+xtralien = None
+
+def load_xtralien():
+    """
+    Imports xtralien on first use.
+
+    Raises:
+        ImportError: If xtralien is not installed.
+    """
+    global xtralien
+    if xtralien is None:
+        try:
+            import xtralien as module
+        except ImportError:
+            raise ImportError("xtralien is not installed (pip install xtralien).") from None
+        xtralien = module
+    return xtralien
+
+# Port/address name that selects the simulated SMU (see smu_sim.py)
+SIM_ADDRESS = "sim"
+
+def get_session(address=None, connection_type='usb', sim_options=None, raise_errors=False):
     """
     Connects to the Ossila SMU.
     
     Args:
         address (str): Port (e.g., '/dev/ttyUSB0', 'COM3') or IP address.
                        If None, tries to auto-detect (implementation limited).
-        connection_type (str): 'usb' or 'ethernet'.
+                       The address "sim" selects the simulated device.
+        connection_type (str): 'usb', 'ethernet' or 'sim'.
+        sim_options (dict): Keyword arguments for smu_sim.SimulatedDevice
+                            (latency, noise, resistance, ...).
+        raise_errors (bool): Raise ConnectionError (with the original error as
+                             its cause) instead of printing it and returning None.
         
     Returns:
         xtralien.Device: The connected device object.
     """
+    if address == SIM_ADDRESS:
+        connection_type = 'sim'
     print(f"Attempting to connect via {connection_type}...")
     
+    device = None
+    start = time.perf_counter()
     try:
-        if connection_type.lower() == 'ethernet':
+        if connection_type.lower() == 'sim':
+            import smu_sim
+            device = smu_sim.SimulatedDevice(address or SIM_ADDRESS, **(sim_options or {}))
+        elif connection_type.lower() == 'ethernet':
             if not address:
                 raise ValueError("IP address is required for Ethernet connection.")
             # Default port is 8888 as per docs
-            device = xtralien.Device(address, port=8888)
+            device = load_xtralien().Device(address, port=8888)
         else:
             # USB Connection
             if address:
-                device = xtralien.Device(address)
+                device = load_xtralien().Device(address)
             else:
                 # If no address provided, we might want to hint the user or just fail
                 # For now, let's try a common default or raise error
                 print("No port specified. Please provide a COM port (e.g. /dev/ttyUSB0 or COM3)")
+                if raise_errors:
+                    raise ConnectionError("No port specified.")
                 return None
 
         # Verify connection with a simple command
@@ -37,12 +75,50 @@ def get_session(address=None, connection_type='usb'):
         # We assume the library returns the string directly.
         response = device.cloi.hello()
         print(f"Device responded: {response.strip()}")
+        instrumentation.observe("smu_connect_seconds", time.perf_counter() - start,
+                                type=connection_type.lower())
         return device
 
     except Exception as e:
+        instrumentation.count("smu_connect_errors_total", type=connection_type.lower())
+        if device is not None:
+            # Opened but did not answer: release the port
+            try: device.close()
+            except Exception: pass
+        if raise_errors:
+            if isinstance(e, ConnectionError):
+                raise
+            raise ConnectionError(f"Failed to connect to {address}: {e}") from e
         print(f"Failed to connect: {e}")
         return None
 
+def configure_measurement(device, samples=8192, v_limit=10.5, i_limit=0.22, drive_v=0.5):
+    """
+    Standard four-point-probe setup: enable SMU1 and Vsense1, apply limits and
+    filter depth, then source the drive voltage.
+    
+    Args:
+        samples (int): Filter depth for both channels (64 ... 8192).
+        v_limit (float): Voltage compliance in Volts.
+        i_limit (float): Current compliance in Amps.
+        drive_v (float): Source voltage (sign sets polarity).
+    """
+    device.smu1.set.enabled(True, response=0)
+    device.smu1.set.limitv(v_limit, response=0)
+    device.smu1.set.limiti(i_limit, response=0)
+    device.smu1.set.filter(samples, response=0)
+    device.vsense1.set.enabled(True, response=0)
+    device.vsense1.set.filter(samples, response=0)
+    device.smu1.set.voltage(drive_v, response=0)
+
+def shutdown_output(device):
+    """
+    Returns the source to 0 V and disables both channels (port stays open).
+    """
+    device.smu1.set.voltage(0, response=0)
+    device.smu1.set.enabled(False, response=0)
+    device.vsense1.set.enabled(False, response=0)
+
 def check_compliance_error(device, unit='smu1'):
     """
     Checks if the SMU unit has hit a compliance limit.
@@ -0,0 +1,109 @@
+import time
+
+import numpy as np
+
+from smu_parse import parse_matrix, parse_smu, parse_vsense
+
+
+def sweep_points(drive_v, n_points=5, bipolar=True):
+    """
+    Drive voltages for a multi-point measurement.
+
+    Args:
+        drive_v (float): Largest source voltage magnitude (sign sets polarity).
+        n_points (int): Number of points (at least 2).
+        bipolar (bool): Sweep from -drive_v to +drive_v so thermal EMF and
+                        amplifier offsets end up in the intercept, not the slope.
+
+    Returns:
+        np.ndarray: Source voltages in sweep order.
+    """
+    n_points = max(int(n_points), 2)
+    if bipolar:
+        return np.linspace(-drive_v, drive_v, n_points)
+    return np.linspace(drive_v / n_points, drive_v, n_points)
+
+
+def acquire_sweep(device, voltages, delay=0.0):
+    """
+    Collects (V_outer, I_outer, V_inner) at each drive voltage.
+
+    The inner probes are read by vsense1, which has no device-side sweep, so
+    each point uses `smu1.oneshot(v)` (set + measure in a single round-trip)
+    followed by `vsense1.measure()`: two round-trips per point instead of the
+    set/measure/measure sequence and fixed sleep used for single readings.
+
+    Args:
+        device: Open xtralien.Device (or wrapper) with smu1/vsense1 enabled.
+        voltages (array-like): Drive voltages (see sweep_points).
+        delay (float): Optional settle time per point in seconds.
+
+    Returns:
+        dict: "v_outer", "i_outer", "v_inner" arrays (same length as voltages).
+    """
+    voltages = np.asarray(voltages, dtype=float)
+    out = np.zeros((len(voltages), 3))
+    for k, v in enumerate(voltages):
+        smu_data = device.smu1.oneshot(float(v))
+        if delay:
+            time.sleep(delay)
+        v_data = device.vsense1.measure()
+        out[k, 0], out[k, 1] = parse_smu(smu_data)
+        out[k, 2] = parse_vsense(v_data)
+    return {"v_outer": out[:, 0], "i_outer": out[:, 1], "v_inner": out[:, 2]}
+
+
+def acquire_device_sweep(device, start, inc, end, delay_us=1000):
+    """
+    Outer-probe I-V curve from the on-device `smu1 sweep` command (one
+    round-trip for the whole curve). Useful for checking contact linearity
+    and compliance before a four-point measurement.
+
+    Returns:
+        dict: "v_outer" and "i_outer" arrays.
+    """
+    data = device.smu1.sweep(start, inc, end, delay_us)
+    arr = parse_matrix(data)
+    return {"v_outer": arr[:, 0], "i_outer": arr[:, 1]}
+
+
+def fit_resistance(i_outer, v_inner):
+    """
+    Least-squares fit of V_inner = R * I_outer + offset.
+
+    Returns:
+        dict: {"slope": R (Ohm), "intercept": offset (V), "r_squared": float,
+               "points": number of points used}. The slope is 0.0 when fewer
+               than two points carry current.
+    """
+    i = np.asarray(i_outer, dtype=float)
+    v = np.asarray(v_inner, dtype=float)
+    mask = np.isfinite(i) & np.isfinite(v)
+    i, v = i[mask], v[mask]
+    if len(i) < 2 or np.ptp(i) == 0:
+        return {"slope": 0.0, "intercept": 0.0, "r_squared": 0.0, "points": int(len(i))}
+
+    slope, intercept = np.polyfit(i, v, 1)
+    residual = v - (slope * i + intercept)
+    total = v - v.mean()
+    ss_tot = float(total @ total)
+    r_squared = 1.0 - float(residual @ residual) / ss_tot if ss_tot > 0 else 1.0
+    return {"slope": float(slope), "intercept": float(intercept),
+            "r_squared": r_squared, "points": int(len(i))}
+
+
+def measure_sheet_resistance(device, logic, voltages, geometry, thickness_microns,
+                             delay=0.0, **dims):
+    """
+    Multi-point four-point-probe measurement: sweep, fit, compute metrics.
+
+    The fitted slope replaces the single V/I ratio in calculate_metrics.
+
+    Returns:
+        tuple: (metrics dict, fit dict, sweep data dict)
+    """
+    data = acquire_sweep(device, voltages, delay=delay)
+    fit = fit_resistance(data["i_outer"], data["v_inner"])
+    current = 1.0 if fit["slope"] != 0.0 else 0.0
+    metrics = logic.calculate_metrics(fit["slope"], current, geometry, thickness_microns, **dims)
+    return metrics, fit, data
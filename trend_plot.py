@@ -0,0 +1,89 @@
+import pyqtgraph as pg
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox
+
+from ring_buffer import MinMaxEnvelope
+
+# Traces that can be shown: (label, ring buffer column, unit)
+# pyqtgraph adds the SI prefix (m, μ, k) to the axis itself.
+TRACES = [
+    ("Sheet Resistance", "sheet_resistance", "Ω/sq"),
+    ("Outer Probe Current", "i_outer", "A"),
+    ("Inner Probe Voltage", "v_inner", "V"),
+]
+
+TREND_MAX_POINTS = 2000   # Points actually drawn (min/max envelope)
+
+
+class TrendPlot(QWidget):
+    """
+    Real-time trend panel for the desktop GUI.
+
+    Readings are folded into a MinMaxEnvelope as they arrive, so each display
+    tick only hands its (at most TREND_MAX_POINTS) points to pyqtgraph; neither
+    memory nor repaint cost grows with the length of the run.
+    """
+
+    def __init__(self, parent=None, max_points=TREND_MAX_POINTS):
+        super().__init__(parent)
+        self.history = MinMaxEnvelope([t[1] for t in TRACES], max_points)
+        self.t0 = None
+        self._drawn_total = -1
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        header = QHBoxLayout()
+        header.addWidget(QLabel("Trend"))
+        self.trace_combo = QComboBox()
+        self.trace_combo.addItems([t[0] for t in TRACES])
+        self.trace_combo.currentIndexChanged.connect(self.on_trace_changed)
+        header.addWidget(self.trace_combo)
+        header.addStretch()
+        layout.addLayout(header)
+
+        self.plot_widget = pg.PlotWidget()
+        self.plot_widget.setBackground("#1e1e1e")
+        self.plot_widget.showGrid(x=True, y=True, alpha=0.3)
+        self.plot_widget.setLabel("bottom", "Time", units="s")
+        plot_item = self.plot_widget.getPlotItem()
+        plot_item.setClipToView(True)
+        self.curve = self.plot_widget.plot(pen=pg.mkPen("#ba68c8", width=2))
+        layout.addWidget(self.plot_widget)
+        self.on_trace_changed()
+
+    def append(self, reading, metrics):
+        """
+        Adds one acquisition.Reading and its calculate_metrics() result.
+        Cheap; drawing happens in refresh().
+        """
+        if self.t0 is None:
+            self.t0 = reading.timestamp
+        self.history.append(reading.timestamp - self.t0, [
+            metrics["sheet_resistance"],
+            reading.i_outer,
+            reading.v_inner
+        ])
+
+    def refresh(self, force=False):
+        """
+        Redraws the selected trace if new readings arrived since the last call.
+        """
+        if not force and self.history.total == self._drawn_total:
+            return
+        self._drawn_total = self.history.total
+        if not len(self.history):
+            self.curve.setData([], [])
+            return
+        _, column, _ = TRACES[self.trace_combo.currentIndex()]
+        t, y = self.history.trace(column)
+        self.curve.setData(t, y)
+
+    def clear(self):
+        self.history.clear()
+        self.t0 = None
+        self.refresh(force=True)
+
+    def on_trace_changed(self):
+        label, _, unit = TRACES[self.trace_combo.currentIndex()]
+        self.plot_widget.setLabel("left", label, units=unit)
+        self.refresh(force=True)
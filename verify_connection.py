@@ -1,12 +1,40 @@
 import smu_utils
 import sys
 
+def scan(targets):
+    """
+    Finds networked SMUs in subnets/ranges/addresses (see net_discovery).
+    """
+    import net_discovery
+    
+    print(f"--- Scanning {', '.join(targets)} on port {net_discovery.SMU_PORT} ---")
+    try:
+        devices = net_discovery.discover(targets)
+    except ValueError as e:
+        print(f"FAIL: {e}")
+        sys.exit(2)
+    if not devices:
+        print("FAIL: No hosts answered.")
+        sys.exit(1)
+    print(net_discovery.format_inventory(devices))
+    smus = [d for d in devices if d.smu]
+    if not smus:
+        print("\nFAIL: Hosts answered, but none completed the CLOI handshake.")
+        sys.exit(1)
+    print(f"\nSUCCESS: {len(smus)} SMU(s) found. Fastest: {smus[0].address}")
+    print(f"Connect with: python verify_connection.py {smus[0].address} ethernet")
+
 def main():
     """
     Simple script to verify connection to the Ossila SMU.
     Usage: python verify_connection.py [port_or_ip] [connection_type]
+           python verify_connection.py --scan 192.168.0.0/24 [more targets...]
     """
     
+    if len(sys.argv) > 2 and sys.argv[1] == "--scan":
+        scan(sys.argv[2:])
+        return
+    
     # Default arguments
     address = None
     conn_type = 'usb'
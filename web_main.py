@@ -1,19 +1,117 @@
 import streamlit as st
-import pandas as pd
 import time
+import datetime
+import numpy as np
+import instrumentation
 import smu_utils
+import smu_pool
+import sweep_acquisition
+import adaptive
+import settling
+import mapping
+from acquisition import read_reading
+from port_discovery import PortDiscovery
+from recorder import StreamingRecorder
+from ring_buffer import RingBuffer, decimate_minmax
 from gui_logic import MeasurementLogic
-import plotly.express as px
-import serial.tools.list_ports
 
 # Custom Style
 st.set_page_config(page_title="GU Lab Sheet Resistance", page_icon="⚡", layout="wide")
 
+WEB_COLUMNS = ["Time", "Current (A)", "Voltage (V)", "Sheet Res (Ω/sq)",
+               "Resistivity (Ω.m)", "Conductivity (S/m)"]
+DEFAULT_HISTORY = 10000   # Readings kept in memory for the chart/table
+CHART_MAX_POINTS = 2000   # Chart is min/max decimated beyond this
+TABLE_ROWS = 200          # Newest rows shown in the data table
+
 # Initialize Session State
-if 'data' not in st.session_state:
-    st.session_state['data'] = []
+if 'history' not in st.session_state:
+    # "Time" is stored as Unix seconds; formatted only for display/export
+    st.session_state['history'] = RingBuffer(DEFAULT_HISTORY, WEB_COLUMNS)
+if 'recorder' not in st.session_state:
+    st.session_state['recorder'] = None
+if 'chart' not in st.session_state:
+    st.session_state['chart'] = (-1, None)
+if 'csv' not in st.session_state:
+    st.session_state['csv'] = (-1, None)
+if 'site_map' not in st.session_state:
+    # Mapping mode: results keyed by (sample_id, x, y) plus next-site index per sample
+    st.session_state['site_map'] = mapping.SiteMap()
+    st.session_state['map_index'] = {}
+    st.session_state['map_fig'] = (-1, None)
+    st.session_state['map_csv'] = (-1, None)
+if 'settle_time' not in st.session_state:
+    # Last achieved settle time per port, reused as a head start next press
+    st.session_state['settle_time'] = {}
+if 'adaptive_depth' not in st.session_state:
+    # Filter depth the next adaptive reading starts at, per port
+    st.session_state['adaptive_depth'] = {}
+
+def format_time(t):
+    return time.strftime("%H:%M:%S", time.localtime(t))
+
+def history_frame(history, n=None):
+    # Newest first, like the original prepend-ordered table
+    import pandas as pd # Only needed once there is data to show
+    cols = history.tail(n)
+    df = pd.DataFrame({name: cols[name][::-1] for name in WEB_COLUMNS})
+    df["Time"] = [format_time(t) for t in df["Time"]]
+    return df
+
+def get_recorder():
+    # One results file per browser session; every reading is written and
+    # fsync'd immediately so a closed tab or crashed server loses nothing.
+    if st.session_state['recorder'] is None:
+        filename = f"results/measurement_web_{time.strftime('%Y%m%d_%H%M%S')}.csv"
+        st.session_state['recorder'] = StreamingRecorder(
+            filename, WEB_COLUMNS, chunk_size=1, fsync_interval=0.0
+        )
+    return st.session_state['recorder']
     
-logic = MeasurementLogic()
+@st.cache_resource
+def get_logic():
+    # Shared across reruns so the correction-factor cache stays warm
+    return MeasurementLogic()
+
+logic = get_logic()
+
+@st.cache_resource
+def start_metrics():
+    # Exports configured by SMU_METRICS_PORT / SMU_METRICS_JSON (once per process)
+    return instrumentation.autostart()
+
+@st.cache_resource
+def get_connection_manager():
+    # One pool per server process, shared by all browser sessions and reruns
+    return smu_pool.ConnectionManager()
+
+@st.cache_resource
+def get_port_discovery():
+    # One background scanner per server process: reruns read its cache instead
+    # of enumerating ports, and new ports are probed with cloi.hello() (ports
+    # the pool already has open are left alone)
+    discovery = PortDiscovery(is_busy=get_connection_manager().is_open)
+    discovery.start()
+    return discovery
+
+def port_label(port):
+    info = get_port_discovery().info(port) or {}
+    return {True: f"{port}  ✓ SMU", None: f"{port}  (probing...)"}.get(info.get("smu"), port)
+
+def map_csv(site_map):
+    # Per-site CSV for the Map tab download, rebuilt only when the map changed
+    import csv, io
+    revision, data = st.session_state['map_csv']
+    if revision != site_map.revision:
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=mapping.SITE_COLUMNS)
+        writer.writeheader()
+        writer.writerows(site_map.rows())
+        data = buf.getvalue().encode('utf-8')
+        st.session_state['map_csv'] = (site_map.revision, data)
+    return data
+
+start_metrics()
 
 # --- SIDEBAR ---
 with st.sidebar:
@@ -23,16 +121,21 @@ with st.sidebar:
     # 1. Connection
     st.header("Connection")
     
-    # Dynamic Port List
-    ports = serial.tools.list_ports.comports()
-    port_list = [p.device for p in ports]
+    # Dynamic Port List (cached; refreshed in the background)
+    discovery = get_port_discovery()
+    port_list = discovery.ports()
     # Add defaults if missing
     if "/dev/ttyACM0" not in port_list: port_list.append("/dev/ttyACM0")
     if "/dev/ttyUSB0" not in port_list: port_list.append("/dev/ttyUSB0")
+    port_list.append(smu_utils.SIM_ADDRESS)
     
-    selected_port = st.selectbox("Select Port", port_list, index=0 if port_list else None)
+    # Pre-select the first port that answered cloi.hello()
+    best = discovery.best_port()
+    selected_port = st.selectbox("Select Port", port_list, format_func=port_label,
+                                 index=port_list.index(best) if best in port_list else 0)
     
     if st.button("Refresh Ports"):
+        discovery.refresh()
         st.rerun()
 
     st.divider()
@@ -57,7 +160,13 @@ with st.sidebar:
     # 3. Advanced Settings
     with st.expander("Advanced Settings", expanded=False):
         spacing = st.number_input("Probe Spacing (mm)", value=1.270, format="%.3f")
-        samples = st.selectbox("Samples per Point", [64, 256, 1024, 4096, 8192], index=4)
+        samples = st.selectbox("Samples per Point", [64, 256, 1024, 4096, 8192, "Adaptive"],
+                               index=4,
+                               help="Adaptive raises the filter depth per reading only "
+                                    "until the target precision is reached.")
+        if samples == "Adaptive":
+            target_pct = st.number_input("Target Precision (%)", value=0.10, min_value=0.001,
+                                         format="%.3f")
         
         polarity_txt = st.selectbox("Polarity", ["Positive", "Negative"])
         polarity = 1.0 if polarity_txt == "Positive" else -1.0
@@ -66,6 +175,34 @@ with st.sidebar:
         i_limit_ma = st.number_input("Current Limit (mA)", value=220.00)
         
         drive_v = st.number_input("Drive Voltage (V)", value=0.50)
+        
+        # Settling: poll fast readings until V/I stops drifting (no fixed sleep)
+        settle_tol_pct = st.number_input("Settle Tolerance (%)", value=0.50, min_value=0.01,
+                                         format="%.2f")
+        settle_timeout = st.number_input("Settle Timeout (s)", value=2.0, min_value=0.1)
+        
+        history_size = st.number_input("History Size (readings)", value=DEFAULT_HISTORY,
+                                       min_value=100, step=1000)
+        
+        # Sweep Fit: several drive points per press, R from the V_inner/I slope
+        acq_mode = st.selectbox("Acquisition Mode", ["Single Point", "Sweep Fit", "Mapping"])
+        sweep_n = st.number_input("Sweep Points", value=5, min_value=2, max_value=101, step=1,
+                                  disabled=(acq_mode != "Sweep Fit"))
+    
+    # Mapping: one averaged reading per probe position on a grid
+    if acq_mode == "Mapping":
+        st.header("Mapping")
+        sample_id = st.text_input("Sample ID", value="sample-1")
+        map_nx = st.number_input("Grid Columns", value=5, min_value=1, step=1)
+        map_ny = st.number_input("Grid Rows", value=5, min_value=1, step=1)
+        map_pitch = st.number_input("Site Pitch (mm)", value=10.0, min_value=0.001)
+        map_wafer = st.number_input("Wafer Diameter (mm, 0 = full grid)", value=0.0, min_value=0.0)
+        map_edge = st.number_input("Edge Exclusion (mm)", value=3.0, min_value=0.0,
+                                   disabled=(map_wafer == 0))
+        site_readings = st.number_input("Readings per Site", value=4, min_value=1, step=1,
+                                        disabled=(samples == "Adaptive"))
+        positions = mapping.grid_positions(int(map_nx), int(map_ny), map_pitch,
+                                           diameter=map_wafer or None, edge_exclusion=map_edge)
 
 # --- MAIN AREA ---
 st.title("GU Lab Sheet Resistance Lite")
@@ -79,88 +216,162 @@ with col1:
 
 with col2:
     if st.button("Clear Data", use_container_width=True):
-        st.session_state['data'] = []
+        st.session_state['history'].clear()
+        # The chart/CSV caches are keyed by history.total, which restarts at 0
+        st.session_state['chart'] = (-1, None)
+        st.session_state['csv'] = (-1, None)
+        if st.session_state['recorder'] is not None:
+            st.session_state['recorder'].close()
+            st.session_state['recorder'] = None
         st.rerun()
 
+site_map = st.session_state['site_map']
+if acq_mode == "Mapping":
+    map_index = st.session_state['map_index']
+    site_k = map_index.get(sample_id, 0)
+    if not positions:
+        st.warning("No sites: the grid lies entirely outside the wafer.")
+    elif site_k < len(positions):
+        st.info(f"**{sample_id}** — place the probe at site {site_k + 1} of {len(positions)}: "
+                f"x = {positions[site_k][0]:g} mm, y = {positions[site_k][1]:g} mm, then MEASURE.")
+    else:
+        st.success(f"**{sample_id}** — all {len(positions)} sites measured.")
+    m_col1, m_col2, _ = st.columns([1, 1, 2])
+    if m_col1.button("Skip Site", disabled=site_k >= len(positions)):
+        map_index[sample_id] = site_k + 1
+        st.rerun()
+    if m_col2.button("Restart Map"):
+        map_index[sample_id] = 0
+        site_map.clear(sample_id)
+        st.rerun()
+
+if st.session_state['history'].capacity != history_size:
+    st.session_state['history'] = st.session_state['history'].resized(history_size)
+history = st.session_state['history']
+
 # MEASUREMENT LOGIC
 if measure_btn:
     status = st.status(f"Connecting to {selected_port}...", expanded=True)
     try:
-        # 1. Connect
-        device = smu_utils.get_session(selected_port)
-        if not device:
-            status.error("Failed to connect.")
-            st.stop()
-            
-        status.write("Configuring SMU...")
-        # 2. Configure
-        device.smu1.set.enabled(True, response=0)
-        device.smu1.set.limitv(v_limit, response=0)
-        device.smu1.set.limiti(i_limit_ma * 1e-3, response=0)
-        device.smu1.set.filter(samples, response=0)
-        device.vsense1.set.enabled(True, response=0)
-        device.vsense1.set.filter(samples, response=0)
-        
-        # 3. Measure
-        target_v = drive_v * polarity
-        status.write(f"Sourcing {target_v} V...")
-        device.smu1.set.voltage(target_v, response=0)
-        time.sleep(0.5) # Settling time
+        if acq_mode == "Mapping" and site_k >= len(positions):
+            raise RuntimeError("Map complete; press Restart Map or change the Sample ID.")
         
-        status.write("Reading sensors...")
-        v_data = device.vsense1.measure()
-        smu_data = device.smu1.measure()
+        def run_measurement(device):
+            """
+            Configure, measure and switch the output off again. Safe to
+            repeat from the top, so a USB error can simply retry it on a
+            reopened port.
+            """
+            result = reading = sweep = fit = metrics = None
+            n_readings = 1
+            status.write("Configuring SMU...")
+            # 2. Configure
+            device.smu1.set.enabled(True, response=0)
+            device.smu1.set.limitv(v_limit, response=0)
+            device.smu1.set.limiti(i_limit_ma * 1e-3, response=0)
+            device.vsense1.set.enabled(True, response=0)
+            if samples == "Adaptive":
+                # Sweeps use the deepest filter; single points pick their own
+                adaptive.set_filter(device, adaptive.FILTER_LADDER[-1])
+            else:
+                adaptive.set_filter(device, samples)
+            
+            # 3. Measure
+            target_v = drive_v * polarity
+            if acq_mode == "Sweep Fit":
+                status.write(f"Sweeping {sweep_n} points up to ±{abs(target_v)} V...")
+                metrics, fit, sweep = sweep_acquisition.measure_sheet_resistance(
+                    device, logic, sweep_acquisition.sweep_points(target_v, sweep_n),
+                    geom_type, thickness,
+                    length=length, width=width, diameter=diameter, spacing=spacing
+                )
+            else:
+                status.write(f"Sourcing {target_v} V...")
+                device.smu1.set.voltage(target_v, response=0)
+                last_settle = st.session_state['settle_time'].get(selected_port, 0.0)
+                settled = settling.settle(device, tolerance=settle_tol_pct / 100,
+                                          timeout=settle_timeout, hint=0.5 * last_settle)
+                st.session_state['settle_time'][selected_port] = settled["settle_time"]
+                status.write(f"Settled in {settled['settle_time']*1000:.0f} ms"
+                             + ("" if settled["settled"] else " (timeout)"))
+                
+                status.write("Reading sensors...")
+                if samples == "Adaptive":
+                    result = adaptive.measure_adaptive(
+                        device, target_pct / 100,
+                        start_depth=st.session_state['adaptive_depth'].get(selected_port))
+                    st.session_state['adaptive_depth'][selected_port] = result["next_filter"]
+                    reading = result["reading"]
+                    n_readings = result["readings"]
+                elif acq_mode == "Mapping":
+                    n_readings = int(site_readings)
+                    reading = mapping.average_reading(device, n_readings)
+                else:
+                    reading = read_reading(device)
+            
+            # 4. Cleanup (output off, port stays open for the next press)
+            device.smu1.set.voltage(0, response=0)
+            device.smu1.set.enabled(False, response=0)
+            device.vsense1.set.enabled(False, response=0)
+            return result, reading, n_readings, metrics, fit, sweep
         
-        # 4. Cleanup
-        device.smu1.set.voltage(0, response=0)
-        device.smu1.set.enabled(False, response=0)
-        device.vsense1.set.enabled(False, response=0)
-        device.close()
+        # 1. Connect (reuses the pooled session if the port is already open) and
+        # run it; retried with backoff on a reopened port after USB errors
+        result, reading, n_readings, metrics, fit, sweep = get_connection_manager().call(
+            selected_port, run_measurement)
         status.update(label="Measurement Complete", state="complete", expanded=False)
         
-        # 5. Parse
-        import numpy as np
-        v_inner = 0.0
-        i_outer = 0.0
-        v_outer = 0.0
-        
-        if v_data is not None:
-             arr = np.array(v_data).flatten()
-             if len(arr) > 0: v_inner = float(arr[0])
-             
-        if smu_data is not None:
-             arr = np.array(smu_data).flatten()
-             if len(arr) >= 2:
-                 v_outer = float(arr[0])
-                 i_outer = float(arr[1])
-                 
-        # 6. Calculate
-        metrics = logic.calculate_metrics(
-            v_inner, i_outer, geom_type, thickness,
-            length=length, width=width, diameter=diameter, spacing=spacing
-        )
+        if acq_mode == "Sweep Fit":
+            # Report the highest-current point next to the fitted value
+            k = int(np.argmax(np.abs(sweep["i_outer"])))
+            i_outer = float(sweep["i_outer"][k])
+            v_inner = float(sweep["v_inner"][k])
+            st.caption(f"Fit: R = {fit['slope']:.6g} Ω, offset = {fit['intercept']*1e6:.2f} μV, "
+                       f"R² = {fit['r_squared']:.5f} ({fit['points']} points)")
+        else:
+            # 5. Parse (both channels come back as one timestamped Reading)
+            v_inner = reading.v_inner
+            i_outer = reading.i_outer
+            if samples == "Adaptive":
+                st.caption(f"Adaptive: filter {result['filter']}, ±{result['rel_uncertainty']*100:.3f} % "
+                           f"from {result['readings']} readings in {result['elapsed']:.2f} s"
+                           + ("" if result["converged"] else " (target not reached)"))
+            
+            # 6. Calculate
+            metrics = logic.calculate_metrics(
+                v_inner, i_outer, geom_type, thickness,
+                length=length, width=width, diameter=diameter, spacing=spacing
+            )
         
         # 7. Store
-        timestamp = time.strftime("%H:%M:%S")
         record = {
-            "Time": timestamp,
+            "Time": time.time(),
             "Current (A)": i_outer,
             "Voltage (V)": v_inner,
             "Sheet Res (Ω/sq)": metrics["sheet_resistance"],
             "Resistivity (Ω.m)": metrics["resistivity"],
             "Conductivity (S/m)": metrics["conductivity"]
         }
-        st.session_state['data'].insert(0, record) # Prepend
+        history.append(record) # O(1), oldest reading dropped when full
+        get_recorder().append({**record, "Time": format_time(record["Time"])})
+        
+        if acq_mode == "Mapping":
+            x, y = positions[site_k]
+            site_map.add(sample_id, x, y, reading, metrics, readings=n_readings)
+            st.session_state['map_index'][sample_id] = site_k + 1
         
     except Exception as e:
         status.update(label="Error", state="error")
         st.error(f"Measurement Failed: {e}")
+    else:
+        if acq_mode == "Mapping":
+            st.rerun() # Redraw the prompt for the next site
 
 # --- DISPLAY ---
 
 # Metrics (Latest)
-if st.session_state['data']:
-    latest = st.session_state['data'][0]
+if len(history):
+    latest = history.latest()
     
     m1, m2, m3 = st.columns(3)
     m1.metric("Sheet Resistance", f"{latest['Sheet Res (Ω/sq)']:.3f} Ω/sq")
@@ -172,27 +383,75 @@ if st.session_state['data']:
     st.divider()
     
     # Charts & Table
-    tab1, tab2 = st.tabs(["📊 Charts", "📄 Data"])
-    
-    df = pd.DataFrame(st.session_state['data'])
+    tab1, tab2, tab3 = st.tabs(["📊 Charts", "📄 Data", "🗺️ Map"])
     
     with tab1:
-        # Plot Sheet Res over time
-        fig = px.line(df, x="Time", y="Sheet Res (Ω/sq)", title="Sheet Resistance Trend", markers=True)
+        # Plot Sheet Res over time; the figure is only rebuilt when new
+        # readings arrived, and long histories are min/max decimated.
+        chart_total, fig = st.session_state['chart']
+        if chart_total != history.total:
+            t, y = decimate_minmax(history.column("Time"), history.column("Sheet Res (Ω/sq)"),
+                                   CHART_MAX_POINTS)
+            x = [datetime.datetime.fromtimestamp(v) for v in t]
+            import plotly.express as px # Loaded with the first chart
+            fig = px.line(x=x, y=y, title="Sheet Resistance Trend", markers=len(y) <= 200,
+                          labels={"x": "Time", "y": "Sheet Res (Ω/sq)"})
+            st.session_state['chart'] = (history.total, fig)
         st.plotly_chart(fig, use_container_width=True)
         
     with tab2:
-        st.dataframe(df, use_container_width=True)
+        st.dataframe(history_frame(history, TABLE_ROWS), use_container_width=True)
+        st.caption(f"Showing the latest {min(len(history), TABLE_ROWS)} of {len(history)} "
+                   f"readings in memory ({history.total} this session).")
         
-        # Download
-        csv = df.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            "Download CSV",
-            csv,
-            "measurement_web.csv",
-            "text/csv",
-            key='download-csv'
-        )
+        # Download (CSV is only serialized on request)
+        if st.button("Prepare CSV"):
+            csv = history_frame(history).to_csv(index=False).encode('utf-8')
+            st.session_state['csv'] = (history.total, csv)
+        csv_total, csv = st.session_state['csv']
+        if csv is not None and csv_total == history.total:
+            st.download_button(
+                "Download CSV",
+                csv,
+                "measurement_web.csv",
+                "text/csv",
+                key='download-csv'
+            )
+    
+    with tab3:
+        map_samples = site_map.samples()
+        if not map_samples:
+            st.caption("No mapped sites yet (Acquisition Mode → Mapping).")
+        else:
+            default = map_samples.index(sample_id) if acq_mode == "Mapping" and sample_id in map_samples else 0
+            map_sample = st.selectbox("Sample", map_samples, index=default)
+            stats = site_map.stats(map_sample)
+            s1, s2, s3, s4 = st.columns(4)
+            s1.metric("Sites", stats["count"])
+            s2.metric("Mean", f"{stats['mean']:.4g} Ω/sq")
+            s3.metric("Std Dev", f"{stats['std']:.3g} Ω/sq")
+            s4.metric("Non-uniformity", f"{stats['non_uniformity_pct'] or 0:.2f} %",
+                      help=f"1σ/mean. Range: {stats['min']:.4g} – {stats['max']:.4g} Ω/sq "
+                           f"((max−min)/(max+min) = {stats['range_pct'] or 0:.2f} %)")
+            
+            # Heatmap over the planned grid; only rebuilt when the map changed
+            fig_key = (site_map.revision, map_sample)
+            cached_key, map_fig = st.session_state['map_fig']
+            if cached_key != fig_key:
+                grid_x = grid_y = None
+                if acq_mode == "Mapping" and map_sample == sample_id and positions:
+                    grid_x, grid_y = zip(*positions)
+                xs, ys, z = site_map.grid(map_sample, "sheet_resistance", grid_x, grid_y)
+                import plotly.express as px
+                map_fig = px.imshow(z, x=xs, y=ys, origin="lower", aspect="equal",
+                                    color_continuous_scale="Viridis",
+                                    labels={"x": "x (mm)", "y": "y (mm)", "color": "Ω/sq"},
+                                    title=f"Sheet Resistance Map — {map_sample}")
+                st.session_state['map_fig'] = (fig_key, map_fig)
+            st.plotly_chart(map_fig, use_container_width=True)
+            
+            st.download_button("Download Map CSV", map_csv(site_map), "map_web.csv",
+                               "text/csv", key='download-map')
 
 else:
     st.info("Click 'MEASURE' to start.")